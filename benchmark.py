@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import platform
+import sys
+from time import perf_counter_ns
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy
+import pygame
+
+from source.settings import SETTINGS, LAYOUT
+
+SETTINGS.DISPLAY_FLAGS = 0
+pygame.init()
+
+DT = 1 / SETTINGS.PHYSICS_RATE
+CASES = {}
+
+
+def case(name, inner=1, repeat=200):
+    def register(setup):
+        CASES[name] = setup, inner, repeat
+        return setup
+    return register
+
+
+def filled_plotter(samples, hovered=False):
+    from source.plot import Plotter
+    from source.widgets import WidgetContainer
+
+    plotter = Plotter(WidgetContainer(), LAYOUT.BOT_PLOT, ((0, 0, 0), (1, 1, 1), (2, 2, 2), (3, 3, 3), ((4, 4, 4),) * 3),
+                      ("A", "B", "C"), samples * DT, 0)
+    time = numpy.arange(samples) * DT
+    for index, name in enumerate(plotter.signals):
+        plotter.load(name, numpy.sin(time * (index + 1)), time)
+
+    plotter.hovered = hovered
+    plotter.mouse_pos = pygame.Vector2(plotter.border.center)
+    return plotter
+
+
+@case("pid.update", inner=1000)
+def pid_update():
+    from source.control import PID
+    controller = PID(20, 1, 5, 100, 10)
+    return lambda: controller.update(1.0, 0.5, DT)
+
+
+@case("system.update", inner=1000)
+def system_update():
+    from source.system import System
+    system = System((0, 0), 0.5, 0.5, 0.1)
+
+    def step():
+        system.apply_force(0.1)
+        system.update(DT)
+    return step
+
+
+@case("delay.update[1s]", inner=1000)
+def delay_update():
+    from source.control import Delay
+    delay = Delay(1.0)
+    now = [0.0]
+
+    def step():
+        now[0] += DT
+        delay.update(now[0])
+        delay.request(now[0])
+    return step
+
+
+@case("sensor.update", inner=1000)
+def sensor_update():
+    from source.control import Sensor
+    sensor = Sensor(0.01, 0.01, 0.5, seed=0)
+    now = [0.0]
+
+    def step():
+        now[0] += DT
+        sensor.update(now[0])
+        sensor.request(0.5)
+    return step
+
+
+@case("simulation.step", inner=1000)
+def simulation_step():
+    from source.simulation import Simulation
+    simulation = Simulation(seed=0, kp=20, ki=1, kd=5, sensor_delay=0.05, actuator_delay=0.02, sensor_noise=0.01)
+    simulation.reference.pos = 1.0
+    return lambda: simulation.step(DT)
+
+
+@case("batch.step[1000]", inner=10)
+def batch_step():
+    from source.batch import BatchSimulation
+    simulation = BatchSimulation(1000, reference=1.0, seed=0, kp=numpy.linspace(0, 50, 1000), kd=5, sensor_delay=0.05)
+    return lambda: simulation.step(DT)
+
+
+@case("timeseries.append+filter", inner=1000)
+def timeseries_append():
+    from source.plot import TimeSeries
+    series = TimeSeries("A", 4096)
+    now = [0.0]
+
+    def step():
+        now[0] += DT
+        series.append(1.0, now[0])
+        series.filter(now[0], SETTINGS.PLOT_TIME_BUFFER_S)
+    return step
+
+
+@case("timeseries.scale[10k]", inner=10)
+def timeseries_scale():
+    plotter = filled_plotter(10000)
+    series = plotter.signals["A"]
+    return lambda: series.scale(*plotter.scaling, (-1, 1))
+
+
+@case("plotter.update_limits[10k]", inner=10)
+def plotter_update_limits():
+    return filled_plotter(10000).update_limits
+
+
+@case("plotter.draw_data[10k]", inner=1)
+def plotter_draw_data():
+    display = pygame.Surface((LAYOUT.WINDOW_WIDTH, LAYOUT.WINDOW_HEIGHT))
+    plotter = filled_plotter(10000)
+    plotter.update_limits()
+    return lambda: plotter.draw_data(display)
+
+
+@case("plotter.draw_data[10k,hover]", inner=1)
+def plotter_draw_hover():
+    display = pygame.Surface((LAYOUT.WINDOW_WIDTH, LAYOUT.WINDOW_HEIGHT))
+    plotter = filled_plotter(10000, hovered=True)
+    plotter.update_limits()
+    return lambda: plotter.draw_data(display)
+
+
+@case("widgets.events", inner=10)
+def widgets_events():
+    framework = make_framework()
+    mouse_pos, mouse_pressed = pygame.Vector2(100, 100), [0, 0, 0, 0]
+    return lambda: framework.widgets.events(mouse_pos, mouse_pressed, [])
+
+
+@case("widgets.render", inner=1)
+def widgets_render():
+    framework = make_framework()
+    return lambda: framework.widgets.render(framework.display)
+
+
+@case("framework.frame", inner=1)
+def framework_frame():
+    framework = make_framework()
+
+    def frame():
+        framework.dt = 1 / SETTINGS.FPS
+        framework.events()
+        framework.update()
+        framework.render()
+    return frame
+
+
+def make_framework():
+    from source.framework import Framework
+
+    framework = Framework()
+    framework.kp_tuner.set_value(20)
+    framework.kd_tuner.set_value(5)
+    framework.reference.move_to(1.0)
+    for _ in range(SETTINGS.FPS):
+        framework.dt = 1 / SETTINGS.FPS
+        framework.events()
+        framework.update()
+    return framework
+
+
+def measure(setup, inner, repeat, warmup=20):
+    function = setup()
+    for _ in range(warmup * inner):
+        function()
+
+    samples = numpy.zeros(repeat)
+    for index in range(repeat):
+        start = perf_counter_ns()
+        for _ in range(inner):
+            function()
+        samples[index] = (perf_counter_ns() - start) / inner
+
+    p50, p95, p99 = numpy.percentile(samples, (50, 95, 99))
+    return dict(p50_us=p50 / 1e3, p95_us=p95 / 1e3, p99_us=p99 / 1e3, per_s=1e9 / p50)
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result["p50_us"] > baseline[name]["p50_us"] * (1 + threshold):
+            regressions.append((name, baseline[name]["p50_us"], result["p50_us"]))
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulation and rendering hot paths.")
+    parser.add_argument("filter", nargs="?", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="fail if a case got slower than this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p50 slowdown (default 0.2)")
+    parser.add_argument("--repeat", type=int, help="override the number of samples per case")
+    arguments = parser.parse_args(arguments)
+
+    results = {}
+    print(f"{'case':32} {'per second':>14} {'p50 [us]':>12} {'p95 [us]':>12} {'p99 [us]':>12}")
+
+    for name, (setup, inner, repeat) in CASES.items():
+        if arguments.filter not in name:
+            continue
+        result = results[name] = measure(setup, inner, arguments.repeat or repeat)
+        print(f"{name:32} {result['per_s']:14.0f} {result['p50_us']:12.2f} {result['p95_us']:12.2f} {result['p99_us']:12.2f}")
+
+    if arguments.save:
+        with open(arguments.save, "w") as file:
+            json.dump(dict(python=platform.python_version(), machine=platform.machine(), results=results), file, indent=4)
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)["results"]
+
+        regressions = compare(results, baseline, arguments.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.2f} us -> {after:.2f} us ({after / before - 1:+.0%})")
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
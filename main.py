@@ -1,6 +1,12 @@
+import sys
+from time import perf_counter
+
+START = perf_counter()
+
 from pygame import init, quit
 
 from source.framework import Framework
+from source.profiler import StartupTimer
 
 from ctypes import windll
 
@@ -11,7 +17,7 @@ errorCode = windll.shcore.SetProcessDpiAwareness(2)
 if __name__ == "__main__":
     init()
 
-    framework = Framework()
+    framework = Framework(replay=sys.argv[1] if len(sys.argv) > 1 else None, startup=StartupTimer(START))
     framework.start()
 
     quit()
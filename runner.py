@@ -0,0 +1,62 @@
+import argparse
+import csv
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from source.scenario import Scenario, run_file
+from source.settings import SETTINGS
+
+
+COLUMNS = ("name", "status", "steps", "seconds") + Scenario.METRICS + ("message",)
+
+
+def collect(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, "*.toml")) + glob.glob(os.path.join(path, "*.json")))
+        else:
+            files.append(path)
+    return files
+
+
+def cell(value):
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return "" if value is None else str(value)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Run scenario files headlessly and summarize the results.")
+    parser.add_argument("paths", nargs="+", help="scenario files (.toml or .json) or directories of them")
+    parser.add_argument("--output", default=SETTINGS.RESULTS_DIR, help="directory for the .npz results and summary.csv")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: all cores)")
+    arguments = parser.parse_args(arguments)
+
+    files = collect(arguments.paths)
+    if not files:
+        parser.error("no scenario files found")
+    os.makedirs(arguments.output, exist_ok=True)
+
+    # Spawned workers, like the gain search, so the runner behaves the same on every platform
+    with ProcessPoolExecutor(arguments.workers, mp_context=get_context("spawn")) as pool:
+        results = list(pool.map(run_file, files, [arguments.output] * len(files)))
+
+    with open(os.path.join(arguments.output, "summary.csv"), "w", newline="") as file:
+        writer = csv.DictWriter(file, COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+    rows = [[cell(result.get(column)) for column in COLUMNS] for result in results]
+    widths = [max(len(column), *(len(row[index]) for row in rows)) for index, column in enumerate(COLUMNS)]
+    for row in [list(COLUMNS)] + rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+    return 0 if all(result["status"] == "ok" for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,42 @@
-from abc import ABC, abstractmethod
+class Interactive:
 
-
-class Interactive(ABC):
+    # Handlers called by source.dispatch.Dispatcher, all optional
+    focusable = False
 
     def __init__(self):
         self.hovered = False
         self.held = False
 
-    @abstractmethod
-    def events(self, mouse_pos, mouse_pressed):
+    def hit(self, mouse_pos):
+        # Exact test for a mouse position inside the indexed area
+        return True
+
+    def on_enter(self, mouse_pos):
+        self.hovered = True
+
+    def on_leave(self):
+        self.hovered = False
+
+    def on_hover(self, mouse_pos):
+        pass
+
+    def on_press(self, button, mouse_pos):
+        pass
+
+    def on_drag(self, mouse_pos):
+        pass
+
+    def on_release(self):
+        self.held = False
+
+    def on_wheel(self, amount):
+        pass
+
+    def on_focus(self):
+        pass
+
+    def on_key(self, event):
+        pass
+
+    def on_blur(self, rollback):
         pass
@@ -0,0 +1,273 @@
+from functools import lru_cache
+from math import factorial, pi
+
+import numpy
+import pygame
+
+from source.plants import load_rail_plant
+from source.settings import SETTINGS, ANALYSIS, LAYOUT, SYSTEM
+from source.widgets import Widget, TEXT_CACHE
+
+
+def pade(delay, order=ANALYSIS.PADE_ORDER):
+    # Numerator and denominator of the [order/order] Padé approximant of exp(-s * delay), highest power first
+    coefficients = numpy.array([
+        factorial(2 * order - k) * factorial(order) / (factorial(2 * order) * factorial(k) * factorial(order - k))
+        for k in range(order + 1)
+    ]) * delay ** numpy.arange(order + 1)
+
+    signs = (-1.0) ** numpy.arange(order + 1)
+    return (coefficients * signs)[::-1], coefficients[::-1]
+
+
+def linearize(plant, mass, damping):
+    # Force to position transfer function of a single coordinate plant, from its Jacobians at rest on a level rail
+    (_, (a, b)), (_, (c,)) = load_rail_plant(plant).jacobian(0.0, 0.0, mass, damping, SYSTEM.G, 0.0, 0.0)
+    return numpy.array([c]), numpy.array([1.0, -b, -a])
+
+
+def loop(kp, ki, kd, nd, mass, damping, sensor_filter, plant=SYSTEM.PLANT):
+    # Rational part of the open loop, without the delays
+    plant = linearize(plant, mass, damping)
+
+    if nd > 0:
+        # The derivative is low-pass filtered at nd Hz, like PID.update_derivative
+        wf = 2 * pi * nd
+        controller = numpy.array([kp + kd * wf, kp * wf + ki, ki * wf]), numpy.array([1.0, wf, 0.0])
+    else:
+        controller = numpy.array([kp, ki]), numpy.array([1.0, 0.0])
+
+    if ki == 0:
+        # Without the integral path the pole at the origin would cancel against a zero there
+        controller = controller[0][:-1], controller[1][:-1]
+
+    # The sensor filter is a discrete first order lag at the physics rate
+    period = 1 / SETTINGS.PHYSICS_RATE
+    if 0 < sensor_filter < 1:
+        sensor = numpy.array([1.0]), numpy.array([period * (1 - sensor_filter) / sensor_filter, 1.0])
+    else:
+        sensor = numpy.array([1.0]), numpy.array([1.0])
+
+    numerator = numpy.polymul(numpy.polymul(plant[0], controller[0]), sensor[0])
+    denominator = numpy.polymul(numpy.polymul(plant[1], controller[1]), sensor[1])
+    return numerator, denominator
+
+
+def crossings(x, y, level):
+    # Log-frequency positions where y passes through the level, linearly interpolated between grid points
+    above = y >= level
+    indices = numpy.nonzero(above[:-1] != above[1:])[0]
+
+    fraction = (level - y[indices]) / (y[indices + 1] - y[indices])
+    return x[indices] + fraction * (x[indices + 1] - x[indices]), indices
+
+
+class Response:
+
+    def __init__(self, omega, open_loop, closed_loop, poles):
+        self.omega = omega
+        self.open_loop = open_loop
+        self.closed_loop = closed_loop
+        self.poles = poles
+
+        with numpy.errstate(divide="ignore"):
+            self.magnitude = 20 * numpy.log10(numpy.abs(open_loop))
+            self.closed_magnitude = 20 * numpy.log10(numpy.abs(closed_loop))
+        self.phase = numpy.degrees(numpy.unwrap(numpy.angle(open_loop)))
+
+        for array in (self.omega, self.open_loop, self.closed_loop, self.magnitude, self.phase, self.closed_magnitude):
+            array.flags.writeable = False
+
+        log_omega = numpy.log10(omega)
+
+        # Phase margin at the worst gain crossover
+        self.phase_margin, self.gain_crossover = None, None
+        positions, indices = crossings(log_omega, self.magnitude, 0)
+        for position, index in zip(positions, indices):
+            margin = (float(numpy.interp(position, log_omega, self.phase)) + 180) % 360
+            margin = margin - 360 if margin > 180 else margin
+            if self.phase_margin is None or margin < self.phase_margin:
+                self.phase_margin, self.gain_crossover = margin, 10 ** position
+
+        # Gain margin at the worst -180 + k * 360 phase crossing
+        self.gain_margin, self.phase_crossover = None, None
+        wrapped = (self.phase + 180) % 360
+        wrapped = numpy.where(wrapped > 180, wrapped - 360, wrapped)
+        continuous = numpy.abs(numpy.diff(wrapped)) < 180
+        positions, indices = crossings(log_omega, wrapped, 0)
+        for position, index in zip(positions, indices):
+            if not continuous[index]:
+                continue
+            margin = -float(numpy.interp(position, log_omega, self.magnitude))
+            if self.gain_margin is None or margin < self.gain_margin:
+                self.gain_margin, self.phase_crossover = margin, 10 ** position
+
+        # Closed loop bandwidth: first drop below -3 dB
+        positions, _ = crossings(log_omega, self.closed_magnitude, ANALYSIS.BANDWIDTH_DB)
+        self.bandwidth = 10 ** positions[0] if len(positions) else None
+
+        self.stable = bool(len(poles)) and bool(numpy.all(poles.real < -ANALYSIS.STABILITY_TOLERANCE))
+
+    def summary(self):
+        def value(number, unit, fmt=".1f"):
+            return "-" if number is None else f"{number:{fmt}}{unit}"
+
+        return (
+            f"GM {value(self.gain_margin, ' dB')} @ {value(self.phase_crossover, ' rad/s', '.3g')} | "
+            f"PM {value(self.phase_margin, ' deg')} @ {value(self.gain_crossover, ' rad/s', '.3g')} | "
+            f"BW {value(self.bandwidth, ' rad/s', '.3g')} | {'stable' if self.stable else 'UNSTABLE'}"
+        )
+
+
+@lru_cache(maxsize=ANALYSIS.CACHE_SIZE)
+def analyze(kp, ki, kd, nd, mass, damping, sensor_delay, actuator_delay, sensor_filter, plant=SYSTEM.PLANT,
+            delay_model=ANALYSIS.DELAY_MODEL):
+    if delay_model not in ANALYSIS.DELAY_MODELS:
+        raise ValueError(f"Unknown delay model '{delay_model}', expected one of {ANALYSIS.DELAY_MODELS}")
+
+    numerator, denominator = loop(kp, ki, kd, nd, mass, damping, sensor_filter, plant)
+
+    # Both delay lines hold at least one physics step, and in a single loop their delays simply add up
+    period = 1 / SETTINGS.PHYSICS_RATE
+    delay = max(sensor_delay, period) + max(actuator_delay, period)
+    delay_numerator, delay_denominator = pade(delay)
+
+    omega = numpy.logspace(*ANALYSIS.FREQUENCY_RANGE, ANALYSIS.POINTS)
+    s = 1j * omega
+
+    if delay_model == "pade":
+        delay_response = numpy.polyval(delay_numerator, s) / numpy.polyval(delay_denominator, s)
+    else:
+        delay_response = numpy.exp(-s * delay)
+
+    open_loop = numpy.polyval(numerator, s) / numpy.polyval(denominator, s) * delay_response
+    closed_loop = open_loop / (1 + open_loop)
+
+    # The closed loop poles always use the Padé approximant, which keeps the characteristic equation polynomial
+    characteristic = numpy.polyadd(
+        numpy.polymul(denominator, delay_denominator), numpy.polymul(numerator, delay_numerator)
+    )
+    poles = numpy.roots(numpy.trim_zeros(characteristic, "f"))
+
+    return Response(omega, open_loop, closed_loop, poles)
+
+
+class AnalysisPanel(Widget):
+
+    def __init__(self, container, rect, color):
+        super().__init__(container, rect, color)
+        self.response = None
+        self.key = None
+
+        border = self.inflate(-LAYOUT.GAP * 2, -LAYOUT.GAP * 2)
+        _, text_height = TEXT_CACHE.size(self.font, "X")
+        top = border.top + text_height + LAYOUT.GAP
+
+        size = min(border.bottom - top, border.width * ANALYSIS.NYQUIST_WIDTH)
+        self.nyquist = pygame.Rect(border.right - size, top, size, size)
+
+        width = self.nyquist.left - LAYOUT.GAP - border.left
+        height = (border.bottom - top - LAYOUT.GAP) / 2
+        self.magnitude = pygame.Rect(border.left, top, width, height)
+        self.phase = pygame.Rect(border.left, top + height + LAYOUT.GAP, width, height)
+
+        self.text_anchor = border.topleft
+
+    @property
+    def layer(self):
+        return 2
+
+    def update(self, parameters, mass, damping, plant=SYSTEM.PLANT):
+        self.key = (
+            parameters["kp"], parameters["ki"], parameters["kd"], parameters["nd"], mass, damping,
+            parameters["sensor_delay"], parameters["actuator_delay"], parameters["sensor_filter"], plant,
+        )
+        self.response = analyze(*self.key)
+
+    def state(self):
+        return self.key
+
+    def x_positions(self, rect):
+        low, high = ANALYSIS.FREQUENCY_RANGE
+        return rect.left + (numpy.log10(self.response.omega) - low) / (high - low) * rect.width
+
+    def y_positions(self, rect, values, limits):
+        low, high = limits
+        return rect.bottom - (numpy.clip(values, low, high) - low) / (high - low) * rect.height
+
+    def draw_frame(self, display, rect, limits, level, title):
+        pygame.draw.rect(display, self.color[1], rect, 1)
+
+        low, high = ANALYSIS.FREQUENCY_RANGE
+        for decade in range(low, high):
+            x = rect.left + (decade - low) / (high - low) * rect.width
+            pygame.draw.line(display, self.color[3], (x, rect.top), (x, rect.bottom), 1)
+
+            label = self.render_text(f"1e{decade}", self.color[2])
+            display.blit(label, label.get_rect(bottomleft=(x + 4, rect.bottom)))
+
+        y = self.y_positions(rect, level, limits)
+        pygame.draw.line(display, self.color[1], (rect.left, y), (rect.right, y), 1)
+
+        display.blit(self.render_text(title, self.color[2]), (rect.left + 4, rect.top + 4))
+
+    def draw_curve(self, display, rect, values, limits, color):
+        points = numpy.column_stack((self.x_positions(rect), self.y_positions(rect, values, limits)))
+        pygame.draw.lines(display, color, False, points.tolist(), 2)
+
+    def draw_marker(self, display, frequency, color):
+        if frequency is None:
+            return
+
+        low, high = ANALYSIS.FREQUENCY_RANGE
+        for rect in (self.magnitude, self.phase):
+            x = rect.left + (numpy.log10(frequency) - low) / (high - low) * rect.width
+            pygame.draw.line(display, color, (x, rect.top), (x, rect.bottom), 1)
+
+    def draw_nyquist(self, display):
+        rect = self.nyquist
+        scale = rect.width / (2 * ANALYSIS.NYQUIST_RANGE)
+        origin = pygame.Vector2(rect.center)
+
+        pygame.draw.rect(display, self.color[1], rect, 1)
+        pygame.draw.line(display, self.color[3], (rect.left, origin.y), (rect.right, origin.y), 1)
+        pygame.draw.line(display, self.color[3], (origin.x, rect.top), (origin.x, rect.bottom), 1)
+        pygame.draw.circle(display, self.color[3], origin, scale, 1)
+        pygame.draw.circle(display, self.color[4][0], origin + (-scale, 0), 4)
+
+        # Far off samples are pulled in so the clipped curve still leaves the frame in the right direction
+        limit = ANALYSIS.NYQUIST_RANGE * 4
+        loop = self.response.open_loop
+        for sign in (1, -1):
+            x = origin.x + numpy.clip(loop.real, -limit, limit) * scale
+            y = origin.y - numpy.clip(loop.imag * sign, -limit, limit) * scale
+            pygame.draw.lines(display, self.color[4][1], False, numpy.column_stack((x, y)).tolist(), 2 if sign > 0 else 1)
+
+        display.blit(self.render_text("Nyquist", self.color[2]), (rect.left + 4, rect.top + 4))
+
+    def render(self, display):
+        pygame.draw.rect(display, self.color[0], self)
+        if self.response is None:
+            return
+
+        response = self.response
+        display.blit(self.render_text(response.summary(), self.color[4][2 if response.stable else 0]), self.text_anchor)
+
+        self.draw_frame(display, self.magnitude, ANALYSIS.MAGNITUDE_RANGE, 0, "Magnitude [dB]")
+        self.draw_frame(display, self.phase, ANALYSIS.PHASE_RANGE, -180, "Phase [deg]")
+
+        self.draw_marker(display, response.gain_crossover, self.color[2])
+        self.draw_marker(display, response.phase_crossover, self.color[2])
+
+        display.set_clip(self.magnitude.clip(display.get_clip()))
+        self.draw_curve(display, self.magnitude, response.closed_magnitude, ANALYSIS.MAGNITUDE_RANGE, self.color[4][2])
+        self.draw_curve(display, self.magnitude, response.magnitude, ANALYSIS.MAGNITUDE_RANGE, self.color[4][1])
+        display.set_clip(self)
+
+        display.set_clip(self.phase.clip(display.get_clip()))
+        self.draw_curve(display, self.phase, response.phase, ANALYSIS.PHASE_RANGE, self.color[4][1])
+        display.set_clip(self)
+
+        display.set_clip(self.nyquist.clip(display.get_clip()))
+        self.draw_nyquist(display)
+        display.set_clip(self)
@@ -0,0 +1,295 @@
+from math import pi
+
+import numpy
+
+from source.integrators import INTEGRATORS, integrate_batch, zoh, exact
+from source.noise import Noise
+from source.plants import load_rail_plant
+from source.settings import SYSTEM
+from source.simulation import Simulation
+
+
+def broadcast(value, n, dtype=numpy.float64):
+    return numpy.array(numpy.broadcast_to(numpy.asarray(value, dtype=dtype), (n,)))
+
+
+class BatchPID:
+
+    def __init__(self, n, kp, ki, kd, nd=SYSTEM.ND, limit=0, anti_windup=False):
+        self.n = n
+
+        self.kp = broadcast(kp, n)
+        self.ki = broadcast(ki, n)
+        self.kd = broadcast(kd, n)
+        self.nd = broadcast(nd, n)
+
+        self.i_term = numpy.zeros(n)
+        self.d_term = numpy.zeros(n)
+
+        self.error = numpy.zeros(n)
+        self.last_error = numpy.zeros(n)
+
+        self.output = numpy.zeros(n)
+
+        self.anti_windup = broadcast(anti_windup, n, bool)
+        self.limit = broadcast(limit, n)
+
+    def update_integral(self, dt):
+        saturated = ((self.output == -self.limit) & (self.error < 0)) | ((self.output == self.limit) & (self.error > 0))
+
+        self.i_term = numpy.where(self.anti_windup & saturated, self.i_term, self.i_term + self.error * dt)
+        self.i_term[self.ki == 0] = 0
+
+    def update_derivative(self, dt):
+        rc = 1 / (2 * pi * self.nd)
+        alpha = dt / (rc + dt)
+
+        self.d_term = self.d_term + alpha * ((self.error - self.last_error) / dt - self.d_term)
+        self.last_error = self.error
+
+    def update(self, reference, measurement, dt):
+        self.error = reference - measurement
+
+        self.update_integral(dt)
+        self.update_derivative(dt)
+
+        output = self.error * self.kp + self.i_term * self.ki + self.d_term * self.kd
+        self.output = numpy.where(self.limit > 0, numpy.clip(output, -self.limit, self.limit), output)
+
+
+class BatchSystem:
+
+    def __init__(self, n, mass, damping, angle=0, time_constant=SYSTEM.ANGLE_TIME_CONSTANT, integrator=SYSTEM.INTEGRATOR,
+                 plant=SYSTEM.PLANT):
+        self.n = n
+
+        self.mass = broadcast(mass, n)
+        self.damping = broadcast(damping, n)
+        self.integrator = integrator
+
+        self.model = None
+        self._plant = None
+        self.plant = plant
+
+        self.target_angle = broadcast(angle, n)
+        self.angle = broadcast(angle, n)
+        self.angle_time_constant = time_constant
+
+        self.pos = numpy.zeros(n)
+        self.vel = numpy.zeros(n)
+        self.acc = numpy.zeros(n)
+
+        self.force = numpy.zeros(n)
+
+        self._zoh = None
+        self._zoh_key = None
+
+    @property
+    def plant(self):
+        return self._plant
+
+    @plant.setter
+    def plant(self, name):
+        self._plant = name
+        self.model = load_rail_plant(name)
+        self._zoh_key = None
+
+    def apply_force(self, force):
+        self.force = self.force + force
+
+    def tilt(self, angle):
+        self.target_angle = broadcast(angle, self.n)
+
+    def update_angle(self, dt):
+        alpha = dt / (self.angle_time_constant + dt)
+
+        angle_error = (numpy.degrees(self.target_angle - self.angle) + 180) % 360 - 180
+        self.angle = self.angle + numpy.radians(angle_error) * alpha
+
+    def acceleration(self, pos, vel):
+        return self.model.acceleration_batch(pos, vel, self.mass, self.damping, SYSTEM.G, self.angle, self.force)[0]
+
+    def update(self, dt):
+        self.update_angle(dt)
+
+        self.acc = self.acceleration(self.pos, self.vel)
+        if self.integrator == "exact":
+            self.pos, self.vel = self.exact_step(dt, SYSTEM.RAIL_LENGTH / 2)
+        else:
+            self.pos, self.vel = integrate_batch(
+                INTEGRATORS[self.integrator], self.acceleration, self.pos, self.vel, dt, SYSTEM.RAIL_LENGTH / 2
+            )
+
+        self.force = numpy.zeros(self.n)
+
+    def exact_step(self, dt, limit):
+        key = dt, self.mass.tobytes(), self.damping.tobytes()
+        if key != self._zoh_key:
+            self._zoh_key = key
+            state_jacobian, _ = self.model.jacobian_batch(self.pos, 0.0, self.mass, self.damping, SYSTEM.G, self.angle, 0.0)
+            self._zoh = zoh(1.0, -state_jacobian[1, 1], dt)
+
+        pos, vel = exact(self.pos, self.vel, self.acceleration(self.pos, 0.0), self._zoh)
+
+        linear = (numpy.abs(self.target_angle - self.angle) < SYSTEM.EXACT_ANGLE_TOLERANCE) & (numpy.abs(pos) < limit)
+        if linear.all():
+            return pos, vel
+
+        fallback_pos, fallback_vel = integrate_batch(
+            INTEGRATORS[SYSTEM.EXACT_FALLBACK], self.acceleration, self.pos, self.vel, dt, limit
+        )
+        return numpy.where(linear, pos, fallback_pos), numpy.where(linear, vel, fallback_vel)
+
+
+class BatchDelay:
+
+    def __init__(self, n, delay=0, capacity=SYSTEM.DELAY_CAPACITY):
+        self.n = n
+        self.delay = broadcast(delay, n)
+        self.timestamp = 0
+        self.period = 0
+        self._value = numpy.zeros(n)
+
+        self._capacity = 1 << max(int(capacity) - 1, 1).bit_length()
+        self._buffer = numpy.zeros((self._capacity, n))
+        self._index = 0
+        self._lag = None
+        self._columns = numpy.arange(n)
+
+    def request(self, value):
+        self._buffer[self._index & (self._capacity - 1)] = value
+        self._index += 1
+
+    def update(self, time):
+        if time > self.timestamp:
+            self.period = time - self.timestamp
+        self.timestamp = time
+
+        if self.period == 0:
+            return
+
+        target = numpy.maximum(self.delay / self.period, 1)
+        if self._lag is None:
+            self._lag = target
+        else:
+            self._lag = self._lag + numpy.clip(target - self._lag, -SYSTEM.DELAY_SLEW, SYSTEM.DELAY_SLEW)
+
+        while self._lag.max() + 2 > self._capacity:
+            self._grow()
+
+        position = self._index - self._lag
+        valid = position >= 0
+
+        base = numpy.floor(numpy.maximum(position, 0)).astype(numpy.int64)
+        fraction = numpy.maximum(position, 0) - base
+        mask = self._capacity - 1
+
+        previous = self._buffer[base & mask, self._columns]
+        value = previous + (self._buffer[(base + 1) & mask, self._columns] - previous) * fraction
+        self._value = numpy.where(valid, value, self._value)
+
+    def _grow(self):
+        indices = numpy.arange(self._index - self._capacity, self._index)
+        indices = indices[indices >= 0]
+        samples = self._buffer[indices & (self._capacity - 1)]
+
+        self._capacity *= 2
+        self._buffer = numpy.zeros((self._capacity, self.n))
+        self._buffer[indices & (self._capacity - 1)] = samples
+
+    @property
+    def value(self):
+        return self._value
+
+
+class BatchActuator(BatchDelay):
+
+    def __init__(self, n, delay=0, limit=0):
+        super().__init__(n, delay)
+        self.limit = broadcast(limit, n)
+
+    @property
+    def value(self):
+        return numpy.where(self.limit > 0, numpy.clip(self._value, -self.limit, self.limit), self._value)
+
+
+class BatchSensor(BatchDelay):
+
+    def __init__(self, n, delay=0, noise_amplitude=0, noise_filter=1, noise_model=SYSTEM.NOISE_MODEL, seed=None):
+        super().__init__(n, delay)
+        self.noise_amplitude = broadcast(noise_amplitude, n)
+        self.noise_filter = broadcast(noise_filter, n)
+        self.noise_model = noise_model
+        self.noise = Noise(noise_model, seed, n)
+
+    def update(self, time):
+        temp = self._value
+        super().update(time)
+
+        if self.noise.model != self.noise_model:
+            self.noise = Noise(self.noise_model, self.noise.generator, self.n)
+
+        noisy_value = self.noise.apply(self._value, self.noise_amplitude)
+        self._value = numpy.where(
+            self.noise_filter > 0, noisy_value * self.noise_filter + temp * (1.0 - self.noise_filter), self._value
+        )
+
+
+class BatchSimulation:
+
+    def __init__(self, n, reference=0, angle=0, seed=None, **parameters):
+        self.n = n
+        self.now = 0
+
+        self.reference = broadcast(reference, n)
+        self.system = BatchSystem(n, SYSTEM.MASS, SYSTEM.DAMPING, angle)
+        self.controller = BatchPID(n, SYSTEM.KP, SYSTEM.KI, SYSTEM.KD, SYSTEM.ND)
+        self.actuator = BatchActuator(n)
+        self.sensor = BatchSensor(n, seed=seed)
+
+        self.configure(**parameters)
+
+    def configure(self, **parameters):
+        for name, value in parameters.items():
+            owner, attribute = Simulation.PARAMETERS[name]
+            if not isinstance(value, str):
+                value = broadcast(value, self.n, bool if name == "anti_windup" else numpy.float64)
+            setattr(getattr(self, owner), attribute, value)
+
+    def step(self, dt):
+        self.now += dt
+
+        self.actuator.update(self.now)
+        self.sensor.update(self.now)
+
+        self.sensor.request(self.system.pos)
+        self.controller.update(self.reference, self.sensor.value, dt)
+        self.actuator.request(self.controller.output)
+
+        self.system.apply_force(self.actuator.value)
+        self.system.update(dt)
+
+    def sample(self):
+        return (
+            self.now,
+            self.reference,
+            self.sensor.value,
+            self.controller.error,
+            self.actuator.value,
+            self.controller.i_term,
+            self.system.pos,
+            self.system.vel,
+            self.system.acc,
+        )
+
+    def run(self, n_steps, dt, signals=Simulation.SIGNALS):
+        indices = [Simulation.SIGNALS.index(name) for name in signals]
+        result = {name: numpy.zeros((n_steps, self.n)) for name in signals}
+
+        for step in range(n_steps):
+            self.step(dt)
+            sample = self.sample()
+            for name, index in zip(signals, indices):
+                result[name][step] = sample[index]
+
+        return result
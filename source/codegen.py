@@ -0,0 +1,133 @@
+import os
+from glob import glob
+
+import sympy
+from sympy.printing.numpy import NumPyPrinter
+from sympy.printing.pycode import PythonCodePrinter
+
+
+class Model:
+
+    def __init__(self, name, coordinates, parameters, inputs, equations):
+        self.name = name
+        self.coordinates = tuple(coordinates)
+        self.parameters = tuple(parameters)
+        self.inputs = tuple(inputs)
+        self.equations = tuple(equations)
+
+    def symbols(self):
+        # Plain symbols for q(t), dq/dt and d2q/dt2, which the printers and the linear solve cannot take as functions
+        t = sympy.Symbol("t")
+        replacements, q, dq, ddq = {}, [], [], []
+
+        for coordinate in self.coordinates:
+            name = coordinate.func.__name__
+            symbols = sympy.symbols(f"{name}, d{name}, dd{name}")
+            replacements[coordinate.diff(t, 2)] = symbols[2]
+            replacements[coordinate.diff(t)] = symbols[1]
+            replacements[coordinate] = symbols[0]
+
+            for group, symbol in zip((q, dq, ddq), symbols):
+                group.append(symbol)
+
+        return replacements, q, dq, ddq
+
+    def derive(self):
+        replacements, q, dq, ddq = self.symbols()
+        equations = [equation.xreplace(replacements) for equation in self.equations]
+
+        # Lagrange equations are linear in the accelerations: M(q) ddq = b(q, dq)
+        mass_matrix, forcing = sympy.linear_eq_to_matrix(equations, ddq)
+        acceleration = sympy.simplify(mass_matrix.LUsolve(forcing))
+
+        derivative = sympy.Matrix([*dq, *acceleration])
+        state_jacobian = sympy.simplify(derivative.jacobian([*q, *dq]))
+        input_jacobian = sympy.simplify(derivative.jacobian(self.inputs))
+
+        arguments = [*q, *dq, *self.parameters, *self.inputs]
+        return arguments, list(acceleration), state_jacobian, input_jacobian
+
+
+def function(name, arguments, outputs, printer, wrap):
+    temporaries, reduced = sympy.cse(outputs, symbols=sympy.numbered_symbols("_t"))
+
+    lines = [f"def {name}({', '.join(str(argument) for argument in arguments)}):"]
+    lines += [f"    {symbol} = {printer.doprint(expression)}" for symbol, expression in temporaries]
+    lines.append(f"    return {wrap([printer.doprint(expression) for expression in reduced])}")
+    return "\n".join(lines)
+
+
+def generate(model, key):
+    arguments, acceleration, state_jacobian, input_jacobian = model.derive()
+    states = 2 * len(model.coordinates)
+    entries = [*state_jacobian, *input_jacobian]
+
+    def vector(values):
+        return f"({', '.join(values)},)"
+
+    def matrices(values):
+        # The state Jacobian A = d(dq, ddq)/d(q, dq) and the input Jacobian B = d(dq, ddq)/du
+        rows = [values[row * states:(row + 1) * states] for row in range(states)]
+        split = states * states
+        columns = [values[split + row * len(model.inputs):split + (row + 1) * len(model.inputs)] for row in range(states)]
+        return f"({vector(vector(row) for row in rows)}, {vector(vector(row) for row in columns)})"
+
+    def batch_vector(values):
+        return f"_broadcast({', '.join(values)})"
+
+    def batch_matrices(values):
+        split = states * states
+        return (
+            f"(_broadcast({', '.join(values[:split])}).reshape({states}, {states}, -1), "
+            f"_broadcast({', '.join(values[split:])}).reshape({states}, {len(model.inputs)}, -1))"
+        )
+
+    scalar = PythonCodePrinter(dict(fully_qualified_modules=True))
+    batch = NumPyPrinter()
+
+    return "\n".join((
+        f"# Generated by source/codegen.py from the '{model.name}' model in system_model.py, do not edit",
+        "import math",
+        "",
+        "import numpy",
+        "",
+        "",
+        f"NAME = {model.name!r}",
+        f"KEY = {key!r}",
+        f"COORDINATES = {tuple(str(coordinate.func.__name__) for coordinate in model.coordinates)!r}",
+        f"PARAMETERS = {tuple(str(parameter) for parameter in model.parameters)!r}",
+        f"INPUTS = {tuple(str(symbol) for symbol in model.inputs)!r}",
+        "",
+        "",
+        "def _broadcast(*values):",
+        "    return numpy.stack(numpy.broadcast_arrays(*(numpy.asarray(value, dtype=numpy.float64) for value in values)))",
+        "",
+        "",
+        function("acceleration", arguments, acceleration, scalar, vector),
+        "",
+        "",
+        function("jacobian", arguments, entries, scalar, matrices),
+        "",
+        "",
+        function("acceleration_batch", arguments, acceleration, batch, batch_vector),
+        "",
+        "",
+        function("jacobian_batch", arguments, entries, batch, batch_matrices),
+        "",
+    ))
+
+
+def write(model, key, path):
+    # Spawned workers may regenerate the same model at once, so each writes its own file and swaps it in whole
+    for stale in glob(os.path.join(os.path.dirname(path), f"{model.name}_{'[0-9a-f]' * len(key)}.py")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:
+                pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as file:
+        file.write(generate(model, key))
+    os.replace(temporary, path)
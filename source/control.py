@@ -1,24 +1,23 @@
-from collections import deque
+from array import array
 from math import pi
-from random import random
 
 import pygame
 
+from source.Interactive import Interactive
+from source.noise import Noise
 from source.settings import COLORS, SETTINGS, SYSTEM
 from source.system import System
 
 
-class Reference:
+class Reference(Interactive):
 
     MARKER_SIZE = 0.1 * SETTINGS.SCALE
 
     def __init__(self, system):
+        super().__init__()
         self.system = system
         self.pos = 0
 
-        self.hovered = False
-        self.held = False
-
     def move(self, velocity, dt):
         self.move_to(self.pos + velocity * dt)
 
@@ -34,19 +33,21 @@ class Reference:
 
         return ex, ey, center, handle
 
-    def events(self, mouse_pos, mouse_pressed):
+    def bounds(self):
         ex, ey, center, handle = self.locate()
 
-        self.hovered = (mouse_pos - handle).length() < System.HANDLE_SIZE * 2
+        margin = System.HANDLE_SIZE + SETTINGS.HANDLE_HIGHLIGHT + Reference.MARKER_SIZE
+        left, right = min(center.x, handle.x), max(center.x, handle.x)
+        top, bottom = min(center.y, handle.y), max(center.y, handle.y)
+        return pygame.Rect(left, top, right - left, bottom - top).inflate(margin * 2 + 2, margin * 2 + 2)
 
-        if mouse_pressed[0] and self.hovered:
-            self.held = True
-        if not mouse_pressed[0]:
-            self.held = False
+    def hit(self, mouse_pos):
+        _, _, _, handle = self.locate()
+        return (mouse_pos - handle).length() < System.HANDLE_SIZE * 2
 
-        if self.held:
-            ray = mouse_pos - self.system.center
-            self.move_to(ray.dot(ex) / SETTINGS.SCALE)
+    def on_drag(self, mouse_pos):
+        ray = mouse_pos - self.system.center
+        self.move_to(ray.dot(self.system.ray) / SETTINGS.SCALE)
 
     def render(self, display):
         ex, ey, center, handle = self.locate()
@@ -120,24 +121,84 @@ class PID:
 
 class Delay:
 
-    def __init__(self, delay):
-        self.queue = deque()
+    def __init__(self, delay, capacity=SYSTEM.DELAY_CAPACITY):
         self.delay = delay
         self.timestamp = 0
+        self.period = 0
         self._value = 0
 
+        # Requests are keyed by sample index and stamped with the time they were made, the capacity is kept a power of
+        # two so wrapping is a mask
+        self._capacity = 1 << max(int(capacity) - 1, 1).bit_length()
+        self._times = array("d", bytes(8 * self._capacity))
+        self._values = array("d", bytes(8 * self._capacity))
+        self._index = 0
+        self._cursor = 0
+        self._lag = None
+
     def request(self, value):
-        self.queue.append((value, self.timestamp))
+        index = self._index & (self._capacity - 1)
+        self._times[index] = self.timestamp
+        self._values[index] = value
+        self._index += 1
 
     def update(self, time):
+        if time > self.timestamp:
+            self.period = time - self.timestamp
         self.timestamp = time
 
-        while self.queue:
-            next_value, next_time = self.queue[0]
-            if self.timestamp - next_time >= self.delay:
-                self._value, _ = self.queue.popleft()
-            else:
-                break
+        if self.period == 0 or self._index == 0:
+            return
+
+        # The delay is in seconds and slews towards a new value instead of jumping, so retuning it never skips or
+        # repeats samples. It is never shorter than the last step, whose sample is the newest one there is
+        target = max(self.delay, self.period)
+        if self._lag is None:
+            self._lag = target
+        else:
+            slew = SYSTEM.DELAY_SLEW * self.period
+            self._lag += min(max(target - self._lag, -slew), slew)
+
+        while self._index - self._cursor + 2 > self._capacity:
+            self._grow()
+
+        # The read time only moves forward while the slew is below one step, so the cursor walks a sample or two
+        read = time - self._lag
+        times, mask, cursor, last = self._times, self._capacity - 1, self._cursor, self._index - 1
+
+        while cursor < last and times[(cursor + 1) & mask] <= read:
+            cursor += 1
+        while cursor > 0 and times[cursor & mask] > read:
+            cursor -= 1
+        self._cursor = cursor
+
+        start = times[cursor & mask]
+        if start > read:
+            return
+
+        previous = self._values[cursor & mask]
+        if cursor == last:
+            self._value = float(previous)
+            return
+
+        following = self._values[(cursor + 1) & mask]
+        self._value = float(previous + (following - previous) * (read - start) / (times[(cursor + 1) & mask] - start))
+
+    def _grow(self):
+        # Unrolled oldest first, so the samples keep their index and wrap into the larger mask
+        first, mask = max(self._index - self._capacity, 0), self._capacity - 1
+        split = first & mask
+        times = self._times[split:] + self._times[:split]
+        values = self._values[split:] + self._values[:split]
+
+        self._capacity *= 2
+        start = first & (self._capacity - 1)
+        for buffer, samples in (("_times", times), ("_values", values)):
+            grown = array("d", bytes(8 * self._capacity))
+            head = min(len(samples), self._capacity - start)
+            grown[start:start + head] = samples[:head]
+            grown[:len(samples) - head] = samples[head:]
+            setattr(self, buffer, grown)
 
     @property
     def value(self):
@@ -157,15 +218,20 @@ class Actuator(Delay):
 
 class Sensor(Delay):
 
-    def __init__(self, delay=0, noise_amplitude=0, noise_filter=1):
+    def __init__(self, delay=0, noise_amplitude=0, noise_filter=1, noise_model=SYSTEM.NOISE_MODEL, seed=None):
         super().__init__(delay)
         self.noise_amplitude = noise_amplitude
         self.noise_filter = noise_filter
+        self.noise_model = noise_model
+        self.noise = Noise(noise_model, seed)
 
     def update(self, time):
         temp = self._value
         super().update(time)
 
-        noisy_value = self._value + (random() * 2 - 1) * self.noise_amplitude
+        if self.noise.model != self.noise_model:
+            self.noise = Noise(self.noise_model, self.noise.generator)
+
+        noisy_value = self.noise.apply(self._value, self.noise_amplitude)
         if self.noise_filter > 0:
             self._value = noisy_value * self.noise_filter + temp * (1.0 - self.noise_filter)
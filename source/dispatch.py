@@ -0,0 +1,153 @@
+import pygame
+
+from source.settings import SETTINGS
+
+
+class SpatialGrid:
+
+    def __init__(self, cell=SETTINGS.EVENT_GRID_CELL):
+        self.cell = cell
+
+        # Widgets are rects, which compare by value and do not hash, so targets are keyed by identity
+        self._cells = {}
+        self._areas = {}
+
+    def __contains__(self, target):
+        return id(target) in self._areas
+
+    def __len__(self):
+        return len(self._areas)
+
+    def keys(self, area):
+        left, top = int(area.left // self.cell), int(area.top // self.cell)
+        right, bottom = int((area.right - 1) // self.cell), int((area.bottom - 1) // self.cell)
+        return [(x, y) for x in range(left, right + 1) for y in range(top, bottom + 1)]
+
+    def insert(self, target, area):
+        area = pygame.Rect(area)
+        self._areas[id(target)] = area
+
+        for key in self.keys(area):
+            self._cells.setdefault(key, {})[id(target)] = target
+
+    def remove(self, target):
+        area = self._areas.pop(id(target), None)
+        if area is None:
+            return
+
+        for key in self.keys(area):
+            cell = self._cells[key]
+            del cell[id(target)]
+            if not cell:
+                del self._cells[key]
+
+    def query(self, point):
+        # Only the targets of one cell are tested, however many are indexed
+        x, y = point
+        cell = self._cells.get((int(x // self.cell), int(y // self.cell)), {})
+        return {key: target for key, target in cell.items() if self._areas[key].collidepoint(x, y)}
+
+
+class Focus:
+
+    def __init__(self):
+        self.target = None
+
+    @property
+    def typing(self):
+        return self.target is not None
+
+    def set(self, target):
+        if target is self.target:
+            return
+
+        self.release(rollback=True)
+        self.target = target
+        target.on_focus()
+
+    def release(self, rollback=False):
+        target, self.target = self.target, None
+        if target is not None:
+            target.on_blur(rollback)
+
+    def key(self, event):
+        if event.key == pygame.K_RETURN:
+            self.release()
+        elif event.key == pygame.K_ESCAPE:
+            self.release(rollback=True)
+        else:
+            self.target.on_key(event)
+
+
+class Dispatcher:
+
+    def __init__(self, cell=SETTINGS.EVENT_GRID_CELL):
+        self.grid = SpatialGrid(cell)
+        self.focus = Focus()
+
+        self.hovered = {}
+        self.captured = {}
+        self.last_pressed = (False, False, False)
+
+    def add(self, target, area=None):
+        self.grid.insert(target, target.area if area is None else area)
+
+    def remove(self, target):
+        self.grid.remove(target)
+
+        self.hovered.pop(id(target), None)
+        self.captured.pop(id(target), None)
+        if self.focus.target is target:
+            self.focus.target = None
+
+    def relocate(self, target, area=None):
+        if target in self.grid:
+            self.grid.remove(target)
+            self.add(target, area)
+
+    def dispatch(self, mouse_pos, mouse_pressed, event_list):
+        hovered = {key: target for key, target in self.grid.query(mouse_pos).items() if target.hit(mouse_pos)}
+
+        # Hover is re-evaluated every frame, targets can move under a resting mouse
+        for key, target in self.hovered.items():
+            if key not in hovered:
+                target.on_leave()
+        for key, target in hovered.items():
+            if key not in self.hovered:
+                target.on_enter(mouse_pos)
+            target.on_hover(mouse_pos)
+        self.hovered = hovered
+
+        for event in event_list:
+            if event.type == pygame.KEYDOWN and self.focus.typing:
+                self.focus.key(event)
+            if event.type == pygame.MOUSEBUTTONDOWN:
+                self.focus.release(rollback=True)
+
+        for button in range(3):
+            if mouse_pressed[button] and not self.last_pressed[button]:
+                self.press(button, mouse_pos)
+
+        if mouse_pressed[3]:
+            for target in hovered.values():
+                target.on_wheel(mouse_pressed[3])
+
+        # Pressed targets keep the mouse until the button is released, wherever it goes
+        if mouse_pressed[0]:
+            for target in self.captured.values():
+                target.on_drag(mouse_pos)
+        else:
+            for target in self.captured.values():
+                target.on_release()
+            self.captured = {}
+
+        self.last_pressed = tuple(mouse_pressed[:3])
+
+    def press(self, button, mouse_pos):
+        for key, target in self.hovered.items():
+            if button == 0:
+                target.held = True
+                self.captured[key] = target
+                if target.focusable:
+                    self.focus.set(target)
+            target.on_press(button, mouse_pos)
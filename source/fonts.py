@@ -0,0 +1,75 @@
+import json
+import os
+
+import pygame
+
+from source.settings import SETTINGS
+
+
+class FontCache:
+
+    def __init__(self, path=SETTINGS.FONT_CACHE):
+        self.path = path
+
+        self._fonts = {}
+        self._matches = None
+
+    def load(self):
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w") as file:
+                json.dump(self._matches, file, indent=4)
+        except OSError:
+            pass
+
+    def match(self, name, bold):
+        # No path means the font bundled with pygame, which needs no enumeration at all. It has no bold face, so pygame
+        # emboldens it
+        if not SETTINGS.SYSTEM_FONTS:
+            return None, bold
+
+        # Matching a system font enumerates every installed font, so the result is remembered between runs
+        if self._matches is None:
+            self._matches = self.load()
+
+        key = f"{name}:{'bold' if bold else 'regular'}"
+        cached = self._matches.get(key)
+        if cached is not None and cached[0] is None:
+            return None, bold
+        if cached is not None and os.path.exists(cached[0]):
+            return cached
+
+        path = pygame.font.match_font(name, bold)
+        synthetic_bold = bold and (path is None or path == pygame.font.match_font(name))
+
+        self._matches[key] = path, synthetic_bold
+        self.save()
+        return path, synthetic_bold
+
+    def get(self, size, bold=True, name=SETTINGS.FONT):
+        key = name, size, bold
+
+        font = self._fonts.get(key)
+        if font is not None:
+            return font
+
+        if not pygame.font.get_init():
+            pygame.font.init()
+
+        path, synthetic_bold = self.match(name, bold)
+        font = self._fonts[key] = pygame.font.Font(path, size)
+        font.bold = synthetic_bold
+        return font
+
+    def clear(self):
+        self._fonts.clear()
+
+
+FONTS = FontCache()
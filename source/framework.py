@@ -1,39 +1,61 @@
-from typing import Optional
+from time import perf_counter
+from typing import Optional, TYPE_CHECKING
 
+import numpy
 import pygame
 from pygame.math import Vector2 as Vector
 
-from source.control import Reference, PID, Actuator, Sensor
 from source.settings import SETTINGS, COLORS, SYSTEM, LAYOUT
+from source.analysis import AnalysisPanel
+from source.control import Reference
+from source.profiler import FrameHistogram, Profiler, StartupTimer
+from source.realtime import SimulationThread
+from source.renderer import Layer, LayeredRenderer
+from source.simulation import Simulation
 from source.system import System
 from source.widgets import Tuner, WidgetContainer, Widget, TextWidget, Switch
 from source.plot import Plotter
 
+if TYPE_CHECKING:
+    from source.recorder import Recorder
+
 
 class Framework:
 
     MS_TO_S = 0.001
 
-    def __init__(self):
+    def __init__(self, replay=None, startup=None):
+        self.startup = startup or StartupTimer()
+        self.startup.mark("imports")
+
         self.display = pygame.display.set_mode((LAYOUT.WINDOW_WIDTH, LAYOUT.WINDOW_HEIGHT), SETTINGS.DISPLAY_FLAGS)
+        self.startup.mark("window")
         self.clock = pygame.time.Clock()
 
         self.dt = 0
-        self.now = 0
+        self.warp = SETTINGS.TIME_WARPS[0]
+        self.rendered = 0
 
         self.paused = False
         self.running = False
 
         self.event_list = None
 
+        # The simulation belongs to the worker, the frame only sees its snapshots and drives it with commands.
+        # System and Reference here are the on-screen copies the user drags around
+        self.worker = SimulationThread(Simulation())
+        self.snapshot = self.worker.snapshot
+        self.sent = {}
+
         self.system: Optional[System] = None
         self.reference: Optional[Reference] = None
-        self.controller: Optional[PID] = None
-        self.actuator: Optional[Actuator] = None
-        self.sensor: Optional[Sensor] = None
 
         self.widgets = WidgetContainer()
-
+        self.renderer = LayeredRenderer()
+        # Drawn over the text widgets, the system has always been the last thing drawn
+        self.scene = Layer(self.scene_area, self.scene_state, self.render_scene, layer=2.5, name="Scene")
+        self.profiler = Profiler()
+        self.frame_histogram = FrameHistogram(WidgetContainer(), LAYOUT.PROFILER, COLORS.PROFILER, self.profiler)
 
         Widget(self.widgets, LAYOUT.LEFT_FIELD, COLORS.FIELD)
         Widget(self.widgets, LAYOUT.RIGHT_FIELD, COLORS.FIELD)
@@ -46,12 +68,12 @@ class Framework:
         filter_setting = dict(limits=[0.1, 100], step=0.1, decimals=1, align="bottomleft")
 
         TextWidget(self.widgets, LAYOUT.CONTROLLER_TEXT, "Controller", COLORS.LABEL)
-        self.kp_tuner = Tuner(self.widgets, LAYOUT.KP_TUNER, "P gain", COLORS.TUNER, 0, **tuner_setting)
-        self.ki_tuner = Tuner(self.widgets, LAYOUT.KI_TUNER, "I gain", COLORS.TUNER, 0, **tuner_setting)
-        self.kd_tuner = Tuner(self.widgets, LAYOUT.KD_TUNER, "D gain", COLORS.TUNER, 0, **tuner_setting)
+        self.kp_tuner = Tuner(self.widgets, LAYOUT.KP_TUNER, "P gain", COLORS.TUNER, SYSTEM.KP, **tuner_setting)
+        self.ki_tuner = Tuner(self.widgets, LAYOUT.KI_TUNER, "I gain", COLORS.TUNER, SYSTEM.KI, **tuner_setting)
+        self.kd_tuner = Tuner(self.widgets, LAYOUT.KD_TUNER, "D gain", COLORS.TUNER, SYSTEM.KD, **tuner_setting)
         self.limit_tuner = Tuner(self.widgets, LAYOUT.LIMIT_TUNER, "Saturation [N]", COLORS.TUNER, 0, **limit_setting)
         self.aw_switch = Switch(self.widgets, LAYOUT.AW_SWITCH, "Anit-windup   ", COLORS.TUNER, False, align="bottomleft")
-        self.nd_tuner = Tuner(self.widgets, LAYOUT.ND_TUNER, "ND filter     ", COLORS.TUNER, 1000, **filter_setting)
+        self.nd_tuner = Tuner(self.widgets, LAYOUT.ND_TUNER, "ND filter     ", COLORS.TUNER, SYSTEM.ND, **filter_setting)
 
         TextWidget(self.widgets, LAYOUT.ACTUATOR_TEXT, "Actuator", COLORS.LABEL, align="topleft")
         self.act_delay_tuner = Tuner(self.widgets, LAYOUT.ACTUATOR_DELAY, "Delay [ms]", COLORS.SETTING, 0, **delay_setting)
@@ -65,16 +87,71 @@ class Framework:
         self.top_plotter = Plotter(self.widgets, LAYOUT.TOP_PLOT, COLORS.TOP_PLOTTER, ("Reference", "Measurement"), SETTINGS.PLOT_TIME_BUFFER_S, SETTINGS.PLOT_SAMPLING_S, limits=(-SYSTEM.RAIL_LENGTH/2, SYSTEM.RAIL_LENGTH/2))
         self.bot_plotter = Plotter(self.widgets, LAYOUT.BOT_PLOT, COLORS.BOT_PLOTTER, ("Error", "Control", "Integrator"), SETTINGS.PLOT_TIME_BUFFER_S, SETTINGS.PLOT_SAMPLING_S)
 
+        self.recorder: Optional["Recorder"] = None
+        self.tuning = None
+        self.tuning_text = TextWidget(self.widgets, LAYOUT.TUNING_TEXT, "Auto-tune [T]", COLORS.LABEL, align="topleft")
+
+        self.warp_text = TextWidget(self.widgets, LAYOUT.WARP_TEXT, self.warp_label, COLORS.LABEL, align="bottomleft")
+
+        self.analysis = AnalysisPanel(WidgetContainer(), LAYOUT.ANALYSIS, COLORS.ANALYSIS)
+        self.fan_chart = None
+        self.robustness = None
+        self.overlay = None
+
         self.debug = TextWidget(self.widgets, (LAYOUT.GAP * 2, LAYOUT.GAP * 2), " ", COLORS.LABEL, align="topleft")
 
+        self.tuners = dict(
+            kp=self.kp_tuner, ki=self.ki_tuner, kd=self.kd_tuner, nd=self.nd_tuner, limit=self.limit_tuner,
+            actuator_delay=self.act_delay_tuner, actuator_limit=self.act_lim_tuner, sensor_delay=self.sensor_delay_tuner,
+            sensor_noise=self.sensor_noise_tuner, sensor_filter=self.sensor_filter_tuner,
+        )
+
+        self.replay = None
+        self.replay_shown = None
+        if replay is not None:
+            # Recording, replay and tuning pull in threads and process pools, so they are only imported when used
+            from source.replay import Replay, Timeline
+            self.replay = Replay(replay)
+            Timeline(self.widgets, LAYOUT.TIMELINE, COLORS.TIMELINE, self.replay)
+            self.debug.set_text(f"Replaying {replay}")
+
         self.reset()
+        self.startup.mark("widgets")
+
+    @property
+    def warp_label(self):
+        return f"Time warp: {'max' if self.warp is None else f'{self.warp}x'} [W]"
 
     def reset(self):
+        recording = self.recorder is not None
+        dispatcher = self.widgets.dispatcher
+        if self.system is not None:
+            dispatcher.remove(self.system)
+            dispatcher.remove(self.reference)
+
         self.system = System(LAYOUT.SYSTEM_CENTER, SYSTEM.MASS, SYSTEM.DAMPING, 0)
         self.reference = Reference(self.system)
-        self.controller = PID(SYSTEM.KP, SYSTEM.KI, SYSTEM.KD)
-        self.actuator = Actuator()
-        self.sensor = Sensor()
+
+        # The new simulation starts from the current settings, so no step runs on the defaults before the next frame
+        simulation = Simulation(**self.parameters)
+        simulation.reference.pos = self.reference.pos
+        simulation.system.tilt(self.system.target_angle)
+
+        self.worker.reset(simulation)
+        self.close_recordings()
+        self.snapshot = self.worker.snapshot
+        self.sent = dict(self.parameters, reference=self.reference.pos, tilt=self.system.target_angle)
+
+        # The handles move with the plant, so they are indexed over the whole scene and hit-tested exactly
+        if self.replay is None:
+            dispatcher.add(self.system, LAYOUT.LEFT_FIELD)
+            dispatcher.add(self.reference, LAYOUT.LEFT_FIELD)
+
+        if recording:
+            self.start_recording()
+
+        self.top_plotter.clear()
+        self.bot_plotter.clear()
 
     def start(self):
         if not self.running:
@@ -88,10 +165,11 @@ class Framework:
         mouse_pressed = [*pygame.mouse.get_pressed(num_buttons=3), 0]
         mouse_pos = Vector(pygame.mouse.get_pos())
 
-        if key_pressed[pygame.K_a] or key_pressed[pygame.K_LEFT]:
-            self.reference.move(-3, self.dt)
-        if key_pressed[pygame.K_d] or key_pressed[pygame.K_RIGHT]:
-            self.reference.move( 3, self.dt)
+        if self.replay is None:
+            if key_pressed[pygame.K_a] or key_pressed[pygame.K_LEFT]:
+                self.reference.move(-3, self.dt)
+            if key_pressed[pygame.K_d] or key_pressed[pygame.K_RIGHT]:
+                self.reference.move( 3, self.dt)
 
         for event in event_list:
             if event.type == pygame.QUIT:
@@ -101,70 +179,318 @@ class Framework:
                     self.running = False
                 if event.key == pygame.K_p:
                     self.paused = not self.paused
+                if event.key == pygame.K_b and not self.widgets.typing:
+                    self.show_overlay(self.analysis)
+                if event.key == pygame.K_m and not self.widgets.typing and self.replay is None:
+                    self.start_robustness()
+                if event.key == pygame.K_F3:
+                    self.toggle_profiler()
+                if event.key == pygame.K_F4 and self.profiler.enabled:
+                    self.debug.set_text(f"Profile exported to {self.profiler.export()}")
+                if self.replay is not None:
+                    self.replay_keys(event.key, key_pressed)
+                    continue
                 if event.key == pygame.K_r:
                     self.reset()
                 if event.key == pygame.K_s:
                     self.reference.pos = -self.reference.pos
+                if event.key == pygame.K_w and not self.widgets.typing:
+                    warps = SETTINGS.TIME_WARPS
+                    self.warp = warps[(warps.index(self.warp) + 1) % len(warps)]
+                    self.warp_text.set_text(self.warp_label)
+                if event.key == pygame.K_t and not self.widgets.typing:
+                    self.start_tuning()
+                if event.key == pygame.K_F5:
+                    if self.recorder is None:
+                        self.start_recording()
+                    else:
+                        self.stop_recording()
             if event.type == pygame.MOUSEWHEEL:
                 mouse_pressed[3] = event.y * (1 + key_pressed[pygame.K_LCTRL] * 9)
 
         self.widgets.events(mouse_pos, mouse_pressed, event_list)
-        self.system.events(mouse_pos, mouse_pressed)
-        self.reference.events(mouse_pos, mouse_pressed)
 
-        self.actuator.delay = self.act_delay_tuner.value * Framework.MS_TO_S
-        self.actuator.limit = self.act_lim_tuner.value
+        if self.replay is not None:
+            return
+
+        self.send_inputs()
+
+    def send_inputs(self):
+        # Only what changed goes to the simulation, stamped with the moment it changed
+        inputs = dict(
+            self.parameters, reference=self.reference.pos, tilt=self.system.target_angle, warp=self.warp, paused=self.paused
+        )
+        changes = {name: value for name, value in inputs.items() if name not in self.sent or self.sent[name] != value}
+
+        if changes:
+            self.worker.send(changes)
+            self.sent.update(changes)
+
+    def replay_keys(self, key, key_pressed):
+        step = 10 if key_pressed[pygame.K_LCTRL] else 1
+
+        if key == pygame.K_r:
+            self.replay.seek(self.replay.start)
+        if key in (pygame.K_LEFT, pygame.K_a):
+            self.replay.seek(self.replay.now - step)
+        if key in (pygame.K_RIGHT, pygame.K_d):
+            self.replay.seek(self.replay.now + step)
+        if key == pygame.K_UP:
+            self.replay.scale_speed(2)
+        if key == pygame.K_DOWN:
+            self.replay.scale_speed(0.5)
+
+    def apply_parameters(self, parameters):
+        for name, value in parameters.items():
+            if name == "anti_windup" and bool(value) != bool(self.aw_switch):
+                self.aw_switch.relay()
+            if name in self.tuners:
+                self.tuners[name].set_value(value / Framework.MS_TO_S if name.endswith("_delay") else value)
+
+    @property
+    def parameters(self):
+        return dict(
+            kp=self.kp_tuner.value,
+            ki=self.ki_tuner.value,
+            kd=self.kd_tuner.value,
+            nd=self.nd_tuner.value,
+            limit=self.limit_tuner.value,
+            anti_windup=bool(self.aw_switch),
+            actuator_delay=self.act_delay_tuner.value * Framework.MS_TO_S,
+            actuator_limit=self.act_lim_tuner.value,
+            sensor_delay=self.sensor_delay_tuner.value * Framework.MS_TO_S,
+            sensor_noise=self.sensor_noise_tuner.value,
+            sensor_filter=self.sensor_filter_tuner.value,
+        )
+
+    def toggle_profiler(self):
+        self.profiler.toggle()
+        self.renderer.profiler = self.profiler if self.profiler.enabled else None
+        self.renderer.invalidate()
+        self.frame_histogram.refresh()
+        self.debug.set_text("Profiling [F3]" if self.profiler.enabled else " ")
+
+    def start_recording(self):
+        from source.recorder import Recorder
+        self.recorder = Recorder()
+
+        # The recorder belongs to the simulation thread from here on, the frame only keeps it to know it is recording
+        self.worker.send(dict(recorder=self.recorder))
+        self.debug.set_text(f"Recording to {self.recorder.path} [F5]")
+
+    def stop_recording(self):
+        self.worker.send(dict(recorder=None))
+        self.recorder = None
+
+        if not self.worker.running:
+            self.worker.sync()
+            self.close_recordings()
+
+    def close_recordings(self):
+        finished = self.worker.finished
+        while finished:
+            recorder = finished.popleft()
+            recorder.close()
+            self.debug.set_text(f"Recorded {recorder.samples} samples to {recorder.path}")
+
+    def start_tuning(self):
+        if self.tuning is None:
+            from source.tuning import GainSearch
+            search = GainSearch(angle=self.system.angle, **self.parameters)
+            self.tuning = search.start()
+            self.tuning_text.set_text(f"Auto-tune: searching {', '.join(search.ranges)} ({search.cost})")
+
+    def show_overlay(self, overlay):
+        self.overlay = None if self.overlay is overlay else overlay
+        self.renderer.invalidate()
+
+    def start_robustness(self):
+        from source.robustness import Robustness, FanChart
+
+        if self.fan_chart is None:
+            self.fan_chart = FanChart(WidgetContainer(), LAYOUT.FAN_CHART, COLORS.FAN_CHART)
+
+        # A new analysis starts whenever the chart is opened and the previous one has finished
+        if self.overlay is not self.fan_chart and self.robustness is None:
+            robustness = Robustness(mass=self.system.mass, damping=self.system.damping, angle=self.system.angle, **self.parameters)
+            self.robustness = robustness.start()
+            self.fan_chart.robustness = robustness
+
+        self.show_overlay(self.fan_chart)
+
+    def finish_robustness(self):
+        if self.robustness is None or not self.robustness.done():
+            return
+
+        error = self.robustness.exception()
+        if error is not None:
+            self.debug.set_text(f"Monte Carlo failed: {error}")
+        self.robustness = None
+
+    def finish_tuning(self):
+        if self.tuning is None or not self.tuning.done():
+            return
+
+        try:
+            best = self.tuning.result()[0]
+        except Exception as error:
+            self.tuning_text.set_text(f"Auto-tune failed: {error}")
+        else:
+            self.apply_parameters({name: value for name, value in best.items() if name != "cost"})
+            self.tuning_text.set_text(f"Auto-tune: cost {best['cost']:.4f}")
+
+        self.tuning = None
+
+    def update_replay(self):
+        if not self.paused:
+            self.replay.advance(self.dt)
+
+        sample = self.replay.sample()
+        if not sample or self.replay.now == self.replay_shown:
+            return
+        self.replay_shown = self.replay.now
 
-        self.sensor.delay = self.sensor_delay_tuner.value * Framework.MS_TO_S
-        self.sensor.noise_amplitude = self.sensor_noise_tuner.value
-        self.sensor.noise_filter = self.sensor_filter_tuner.value
+        self.system.place(sample["position"], sample["angle"])
+        self.reference.pos = sample["reference"]
+        self.apply_parameters(self.replay.parameters())
 
-        self.controller.kp = self.kp_tuner.value
-        self.controller.ki = self.ki_tuner.value
-        self.controller.kd = self.kd_tuner.value
-        self.controller.nd = self.nd_tuner.value
-        self.controller.anti_windup = bool(self.aw_switch)
-        self.controller.limit = self.limit_tuner.value
+        plots = (
+            (self.top_plotter, dict(Reference="reference", Measurement="measurement")),
+            (self.bot_plotter, dict(Error="error", Control="control", Integrator="integrator")),
+        )
+        for plotter, columns in plots:
+            for name, column in columns.items():
+                plotter.load(name, *self.replay.window(column, plotter.time_window, plotter.min_period))
 
     def update(self):
+        if self.replay is not None:
+            self.update_replay()
+            return
 
-        if not self.paused:
-            self.now += self.dt
+        self.finish_tuning()
+        self.finish_robustness()
+
+        if self.worker.error is not None:
+            self.debug.set_text(f"Simulation failed: {self.worker.error}")
+            self.worker.error = None
+
+        if not self.worker.running:
+            # Without the simulation thread (headless use, benchmarks) every frame steps the simulation itself
+            self.worker.advance(self.dt)
+
+        self.close_recordings()
+
+        self.snapshot = snapshot = self.worker.snapshot
+        self.system.mirror(snapshot.pos, snapshot.last_pos, snapshot.angle)
 
-            self.actuator.update(self.now)
-            self.sensor.update(self.now)
+        self.collect(snapshot.now)
 
-            self.sensor.request(self.system.pos)
-            self.controller.update(self.reference.pos, self.sensor.value, self.dt)
-            self.actuator.request(self.controller.output)
+        self.top_plotter.filter(snapshot.now)
+        self.bot_plotter.filter(snapshot.now)
 
-            self.system.apply_force(self.actuator.value)
-            self.system.update(self.dt)
+    def collect(self, now):
+        blocks = self.worker.blocks
+        if not blocks:
+            return
 
-            self.top_plotter.register("Reference", self.reference.pos, self.now)
-            self.top_plotter.register("Measurement", self.sensor.value, self.now)
-            self.bot_plotter.register("Error", self.controller.error, self.now)
-            self.bot_plotter.register("Control", self.actuator.value, self.now)
-            self.bot_plotter.register("Integrator", self.controller.i_term, self.now)
+        samples = numpy.concatenate([blocks.popleft() for _ in range(len(blocks))])
+        samples = samples[samples[:, 0] > now - SETTINGS.PLOT_TIME_BUFFER_S]
+        now, reference, measurement, error, control, integrator = samples.T
 
-            self.top_plotter.filter(self.now)
-            self.bot_plotter.filter(self.now)
+        self.top_plotter.extend("Reference", reference, now)
+        self.top_plotter.extend("Measurement", measurement, now)
+        self.bot_plotter.extend("Error", error, now)
+        self.bot_plotter.extend("Control", control, now)
+        self.bot_plotter.extend("Integrator", integrator, now)
+
+    def scene_area(self):
+        return self.system.bounds().union(self.reference.bounds()).clip(LAYOUT.LEFT_FIELD)
+
+    def scene_state(self):
+        system, reference = self.system, self.reference
+        pos = system.last_pos + (system.pos - system.last_pos) * self.snapshot.alpha
+
+        return (
+            round(pos * SETTINGS.SCALE, 1), system.angle, reference.pos,
+            system.hovered_left, system.hovered_right, system.held_left, system.held_right,
+            reference.hovered, reference.held,
+        )
+
+    def render_scene(self, display):
+        self.reference.render(display)
+        self.system.render(display, self.snapshot.alpha)
 
     def render(self):
-        self.display.fill(COLORS.BACKGROUND)
+        if self.warp != 1:
+            # While warping the frame budget belongs to the simulation
+            now = perf_counter()
+            if now - self.rendered < 1 / SETTINGS.WARP_RENDER_FPS:
+                return
+            self.rendered = now
 
-        self.widgets.render(self.display)
+        items = [*self.widgets, self.scene]
 
-        self.reference.render(self.display)
-        self.system.render(self.display)
+        if self.overlay is not None:
+            if self.overlay is self.analysis:
+                # Cached per parameter set, so this only computes while a tuner is being changed
+                self.analysis.update(self.parameters, self.system.mass, self.system.damping, self.system.plant)
+            items = [item for item in items if not isinstance(item, Plotter)] + [self.overlay]
 
-        pygame.display.flip()
+        if self.profiler.enabled:
+            items.append(self.frame_histogram)
+
+        rects = self.renderer.render(self.display, items)
+        if rects:
+            pygame.display.update(rects)
 
     def loop(self):
+        first_frame = True
 
-        while self.running:
-            self.dt = self.clock.tick_busy_loop(SETTINGS.FPS) * Framework.MS_TO_S
+        if SETTINGS.SIMULATION_THREAD and self.replay is None:
+            self.worker.start()
 
-            self.events()
-            self.update()
-            self.render()
+        while self.running:
+            if self.worker.running:
+                # A busy wait or an uncapped frame would hold the GIL the simulation thread needs, so the frame waits asleep
+                self.dt = self.clock.tick(SETTINGS.FPS) * Framework.MS_TO_S
+            elif self.warp is None:
+                self.dt = self.clock.tick() * Framework.MS_TO_S
+            else:
+                self.dt = self.clock.tick_busy_loop(SETTINGS.FPS) * Framework.MS_TO_S
+
+            if self.profiler.enabled:
+                self.profiled_frame()
+            else:
+                self.events()
+                self.update()
+                self.render()
+
+            if first_frame:
+                first_frame = False
+                self.startup.mark("first frame")
+                self.startup.save()
+                if self.debug.text == " ":
+                    # Shown until the next status message, without taking over one already showing
+                    self.debug.set_text(self.startup.report())
+
+        self.worker.stop()
+
+        if self.recorder is not None:
+            self.stop_recording()
+
+    def profiled_frame(self):
+        profiler = self.profiler
+        steps, dropped = self.snapshot.steps, self.snapshot.dropped
+
+        profiler.begin(self.dt)
+        self.events()
+        profiler.mark("events")
+        self.update()
+        profiler.mark("update")
+        self.render()
+        profiler.mark("render")
+        profiler.end(self.snapshot.steps - steps, self.snapshot.dropped - dropped)
+
+        if profiler.enabled and profiler.index % SETTINGS.PROFILER_REFRESH == 0:
+            self.debug.set_text(profiler.summary())
+            self.frame_histogram.refresh()
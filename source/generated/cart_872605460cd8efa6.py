@@ -0,0 +1,33 @@
+# Generated by source/codegen.py from the 'cart' model in system_model.py, do not edit
+import math
+
+import numpy
+
+
+NAME = 'cart'
+KEY = '872605460cd8efa6'
+COORDINATES = ('x',)
+PARAMETERS = ('m', 'k', 'g', 'f')
+INPUTS = ('u',)
+
+
+def _broadcast(*values):
+    return numpy.stack(numpy.broadcast_arrays(*(numpy.asarray(value, dtype=numpy.float64) for value in values)))
+
+
+def acceleration(x, dx, m, k, g, f, u):
+    return ((-dx*k + g*math.sin(f) + u)/m,)
+
+
+def jacobian(x, dx, m, k, g, f, u):
+    _t0 = 1/m
+    return (((0, 1,), (0, -_t0*k,),), ((0,), (_t0,),))
+
+
+def acceleration_batch(x, dx, m, k, g, f, u):
+    return _broadcast((-dx*k + g*numpy.sin(f) + u)/m)
+
+
+def jacobian_batch(x, dx, m, k, g, f, u):
+    _t0 = m**(-1.0)
+    return (_broadcast(0, 1, 0, -_t0*k).reshape(2, 2, -1), _broadcast(0, _t0).reshape(2, 1, -1))
@@ -0,0 +1,87 @@
+# Generated by source/codegen.py from the 'pendulum' model in system_model.py, do not edit
+import math
+
+import numpy
+
+
+NAME = 'pendulum'
+KEY = '279acc604bf771a2'
+COORDINATES = ('x', 'a')
+PARAMETERS = ('m', 'k', 'g', 'f', 'mp', 'l')
+INPUTS = ('u',)
+
+
+def _broadcast(*values):
+    return numpy.stack(numpy.broadcast_arrays(*(numpy.asarray(value, dtype=numpy.float64) for value in values)))
+
+
+def acceleration(x, a, dx, da, m, k, g, f, mp, l, u):
+    _t0 = a + f
+    _t1 = math.cos(_t0)
+    _t2 = m + mp
+    _t3 = -_t1**2*mp + _t2
+    _t4 = g*math.sin(a)
+    _t5 = g*math.sin(f)
+    _t6 = _t5*mp + _t5 + da**2*l*mp*math.sin(_t0) - dx*k + u
+    return ((_t1*_t4*mp + _t6)/_t3, -(_t1*_t6 + _t2*_t4)/(_t3*l),)
+
+
+def jacobian(x, a, dx, da, m, k, g, f, mp, l, u):
+    _t0 = a + f
+    _t1 = math.cos(_t0)
+    _t2 = _t1**2*mp
+    _t3 = m + mp
+    _t4 = -_t2 + _t3
+    _t5 = _t4**(-2)
+    _t6 = g*math.cos(a)
+    _t7 = da**2*l
+    _t8 = math.sin(_t0)
+    _t9 = g*math.sin(a)
+    _t10 = _t1*mp
+    _t11 = g*math.sin(f)
+    _t12 = _t8*mp
+    _t13 = _t11*mp + _t11 + _t12*_t7 - dx*k + u
+    _t14 = 2*_t8
+    _t15 = 1/_t4
+    _t16 = _t15*k
+    _t17 = 2*da
+    _t18 = 1/l
+    _t19 = _t1*_t18
+    _t20 = 2*a + 2*f
+    return (((0, 0, 1, 0,), (0, 0, 0, 1,), (0, _t5*mp*(-_t1*_t14*(_t10*_t9 + _t13) + _t4*(_t1*_t6 + _t1*_t7 - _t8*_t9)), -_t16, _t12*_t15*_t17*l,), (0, _t18*_t5*(_t10*_t14*(_t1*_t13 + _t3*_t9) + _t4*(_t13*_t8 - _t2*_t7 - _t3*_t6)), _t16*_t19, -_t17*mp*math.sin(_t20)/(2*m - mp*math.cos(_t20) + mp),),), ((0,), (0,), (_t15,), (-_t15*_t19,),))
+
+
+def acceleration_batch(x, a, dx, da, m, k, g, f, mp, l, u):
+    _t0 = a + f
+    _t1 = numpy.cos(_t0)
+    _t2 = m + mp
+    _t3 = -_t1**2*mp + _t2
+    _t4 = g*numpy.sin(a)
+    _t5 = g*numpy.sin(f)
+    _t6 = _t5*mp + _t5 + da**2*l*mp*numpy.sin(_t0) - dx*k + u
+    return _broadcast((_t1*_t4*mp + _t6)/_t3, -(_t1*_t6 + _t2*_t4)/(_t3*l))
+
+
+def jacobian_batch(x, a, dx, da, m, k, g, f, mp, l, u):
+    _t0 = a + f
+    _t1 = numpy.cos(_t0)
+    _t2 = _t1**2*mp
+    _t3 = m + mp
+    _t4 = -_t2 + _t3
+    _t5 = _t4**(-2.0)
+    _t6 = g*numpy.cos(a)
+    _t7 = da**2*l
+    _t8 = numpy.sin(_t0)
+    _t9 = g*numpy.sin(a)
+    _t10 = _t1*mp
+    _t11 = g*numpy.sin(f)
+    _t12 = _t8*mp
+    _t13 = _t11*mp + _t11 + _t12*_t7 - dx*k + u
+    _t14 = 2*_t8
+    _t15 = _t4**(-1.0)
+    _t16 = _t15*k
+    _t17 = 2*da
+    _t18 = l**(-1.0)
+    _t19 = _t1*_t18
+    _t20 = 2*a + 2*f
+    return (_broadcast(0, 0, 1, 0, 0, 0, 0, 1, 0, _t5*mp*(-_t1*_t14*(_t10*_t9 + _t13) + _t4*(_t1*_t6 + _t1*_t7 - _t8*_t9)), -_t16, _t12*_t15*_t17*l, 0, _t18*_t5*(_t10*_t14*(_t1*_t13 + _t3*_t9) + _t4*(_t13*_t8 - _t2*_t7 - _t3*_t6)), _t16*_t19, -_t17*mp*numpy.sin(_t20)/(2*m - mp*numpy.cos(_t20) + mp)).reshape(4, 4, -1), _broadcast(0, 0, _t15, -_t15*_t19).reshape(4, 1, -1))
@@ -0,0 +1,33 @@
+# Generated by source/codegen.py from the 'rolling_ball' model in system_model.py, do not edit
+import math
+
+import numpy
+
+
+NAME = 'rolling_ball'
+KEY = '3b8188d7a5287dea'
+COORDINATES = ('x',)
+PARAMETERS = ('m', 'k', 'g', 'f')
+INPUTS = ('u',)
+
+
+def _broadcast(*values):
+    return numpy.stack(numpy.broadcast_arrays(*(numpy.asarray(value, dtype=numpy.float64) for value in values)))
+
+
+def acceleration(x, dx, m, k, g, f, u):
+    return ((5/7)*(-dx*k + g*math.sin(f) + u)/m,)
+
+
+def jacobian(x, dx, m, k, g, f, u):
+    _t0 = (5/7)/m
+    return (((0, 1,), (0, -_t0*k,),), ((0,), (_t0,),))
+
+
+def acceleration_batch(x, dx, m, k, g, f, u):
+    return _broadcast((5/7)*(-dx*k + g*numpy.sin(f) + u)/m)
+
+
+def jacobian_batch(x, dx, m, k, g, f, u):
+    _t0 = (5/7)/m
+    return (_broadcast(0, 1, 0, -_t0*k).reshape(2, 2, -1), _broadcast(0, _t0).reshape(2, 1, -1))
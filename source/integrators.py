@@ -0,0 +1,185 @@
+from functools import lru_cache
+from math import copysign
+
+import numpy
+
+from source.settings import SYSTEM
+
+
+DERIVATIVE_STEP = 1e-6
+
+DORMAND_PRINCE = (
+    (),
+    (1 / 5,),
+    (3 / 40, 9 / 40),
+    (44 / 45, -56 / 15, 32 / 9),
+    (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+    (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+    (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+)
+DORMAND_PRINCE_ERROR = (71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)
+
+
+def euler(acceleration, pos, vel, dt):
+    return pos + vel * dt, vel + acceleration(pos, vel) * dt
+
+
+def symplectic(acceleration, pos, vel, dt):
+    vel = vel + acceleration(pos, vel) * dt
+    return pos + vel * dt, vel
+
+
+def semi_implicit(acceleration, pos, vel, dt):
+    # Implicit in velocity, so any amount of damping is unconditionally stable
+    acc = acceleration(pos, vel)
+    stiffness = (acceleration(pos, vel + DERIVATIVE_STEP) - acc) / DERIVATIVE_STEP
+
+    vel = vel + acc * dt / (1 - stiffness * dt)
+    return pos + vel * dt, vel
+
+
+def rk4(acceleration, pos, vel, dt):
+    k1p, k1v = vel, acceleration(pos, vel)
+    k2p, k2v = vel + k1v * dt / 2, acceleration(pos + k1p * dt / 2, vel + k1v * dt / 2)
+    k3p, k3v = vel + k2v * dt / 2, acceleration(pos + k2p * dt / 2, vel + k2v * dt / 2)
+    k4p, k4v = vel + k3v * dt, acceleration(pos + k3p * dt, vel + k3v * dt)
+
+    return (
+        pos + (k1p + 2 * k2p + 2 * k3p + k4p) * dt / 6,
+        vel + (k1v + 2 * k2v + 2 * k3v + k4v) * dt / 6,
+    )
+
+
+def dormand_prince(acceleration, pos, vel, dt):
+    k_pos, k_vel = [], []
+
+    for row in DORMAND_PRINCE:
+        stage_pos = pos + dt * sum(a * k for a, k in zip(row, k_pos))
+        stage_vel = vel + dt * sum(a * k for a, k in zip(row, k_vel))
+        k_pos.append(stage_vel)
+        k_vel.append(acceleration(stage_pos, stage_vel))
+
+    # The last stage is evaluated at the 5th order solution (first same as last)
+    error_pos = dt * sum(e * k for e, k in zip(DORMAND_PRINCE_ERROR, k_pos))
+    error_vel = dt * sum(e * k for e, k in zip(DORMAND_PRINCE_ERROR, k_vel))
+
+    return stage_pos, stage_vel, error_pos, error_vel
+
+
+def rk45(acceleration, pos, vel, dt):
+    scalar = numpy.ndim(pos) == 0 and numpy.ndim(dt) == 0
+
+    pos, vel, dt = (numpy.array(array, dtype=numpy.float64) for array in numpy.broadcast_arrays(pos, vel, dt))
+    elapsed = numpy.zeros_like(dt)
+    step = dt.copy()
+
+    for _ in range(SYSTEM.INTEGRATOR_MAX_SUBSTEPS):
+        remaining = dt - elapsed
+        active = remaining > dt * 1e-12
+        if not active.any():
+            break
+
+        step = numpy.where(active, numpy.minimum(step, remaining), 0)
+        new_pos, new_vel, error_pos, error_vel = dormand_prince(acceleration, pos, vel, step)
+
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            error = numpy.maximum(
+                numpy.abs(error_pos) / (SYSTEM.INTEGRATOR_ATOL + SYSTEM.INTEGRATOR_RTOL * numpy.abs(new_pos)),
+                numpy.abs(error_vel) / (SYSTEM.INTEGRATOR_ATOL + SYSTEM.INTEGRATOR_RTOL * numpy.abs(new_vel)),
+            )
+            factor = numpy.clip(0.9 * error ** -0.2, 0.2, 5.0)
+
+        accepted = active & (error <= 1)
+        pos = numpy.where(accepted, new_pos, pos)
+        vel = numpy.where(accepted, new_vel, vel)
+        elapsed = numpy.where(accepted, elapsed + step, elapsed)
+        step = numpy.where(active, step * numpy.nan_to_num(factor, nan=0.2), dt)
+    else:
+        pos, vel, _, _ = dormand_prince(acceleration, pos, vel, dt - elapsed)
+
+    return (float(pos), float(vel)) if scalar else (pos, vel)
+
+
+INTEGRATORS = dict(euler=euler, symplectic=symplectic, semi_implicit=semi_implicit, rk4=rk4, rk45=rk45)
+
+
+def zoh(mass, damping, dt):
+    # Closed form of expm([[A, B], [0, 0]] * dt) for x = (pos, vel), A = [[0, 1], [0, -damping / mass]] and B = (0, 1),
+    # the input being held over the step. Returns the non-trivial entries of Phi = [[1, a], [0, b]] and Gamma = (c, d)
+    decay = numpy.asarray(damping / mass, dtype=numpy.float64)
+    x = decay * dt
+
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        # Series expansions where the exact expressions would cancel catastrophically
+        small = numpy.abs(x) < 1e-5
+        growth = numpy.where(small, dt * (1 - x / 2 + x * x / 6), -numpy.expm1(-x) / decay)
+        drift = numpy.where(small, dt * dt * (1 / 2 - x / 6 + x * x / 24), (dt - growth) / decay)
+
+    return growth, numpy.exp(-x), drift, growth
+
+
+@lru_cache(maxsize=SYSTEM.ZOH_CACHE_SIZE)
+def cached_zoh(mass, damping, dt):
+    return tuple(float(coefficient) for coefficient in zoh(mass, damping, dt))
+
+
+def exact(pos, vel, acceleration, coefficients):
+    growth, decay, drift, gain = coefficients
+    return pos + growth * vel + drift * acceleration, decay * vel + gain * acceleration
+
+
+def integrate(integrator, acceleration, pos, vel, dt, limit):
+    if abs(pos) >= limit and vel == 0 and acceleration(pos, 0.0) * pos >= 0:
+        return copysign(limit, pos), 0.0
+
+    new_pos, new_vel = integrator(acceleration, pos, vel, dt)
+    if abs(new_pos) <= limit:
+        return new_pos, new_vel
+
+    # Rail end contact: locate the impact inside the step, stop there and spend the rest of the step from rest
+    wall = copysign(limit, new_pos)
+    low, high = 0.0, 1.0
+    for _ in range(SYSTEM.EVENT_ITERATIONS):
+        middle = (low + high) / 2
+        if abs(integrator(acceleration, pos, vel, dt * middle)[0]) > limit:
+            high = middle
+        else:
+            low = middle
+
+    if acceleration(wall, 0.0) * wall >= 0:
+        return wall, 0.0
+
+    new_pos, new_vel = integrator(acceleration, wall, 0.0, dt * (1 - low))
+    if abs(new_pos) > limit:
+        return copysign(limit, new_pos), 0.0
+    return new_pos, new_vel
+
+
+def integrate_batch(integrator, acceleration, pos, vel, dt, limit):
+    new_pos, new_vel = integrator(acceleration, pos, vel, dt)
+
+    crossed = numpy.abs(new_pos) > limit
+    if not crossed.any():
+        return new_pos, new_vel
+
+    wall = numpy.copysign(limit, new_pos)
+    rest = numpy.zeros_like(wall)
+    outward = acceleration(wall, rest) * wall >= 0
+    resting = (numpy.abs(pos) >= limit) & (vel == 0) & outward
+
+    low = numpy.zeros_like(wall)
+    if (crossed & ~resting).any():
+        high = numpy.ones_like(wall)
+        for _ in range(SYSTEM.EVENT_ITERATIONS):
+            middle = (low + high) / 2
+            beyond = numpy.abs(integrator(acceleration, pos, vel, dt * middle)[0]) > limit
+            high = numpy.where(beyond, middle, high)
+            low = numpy.where(beyond, low, middle)
+
+    bounce_pos, bounce_vel = integrator(acceleration, wall, rest, numpy.where(crossed, dt * (1 - low), 0))
+    bounce_vel = numpy.where(numpy.abs(bounce_pos) > limit, 0, bounce_vel)
+    bounce_pos = numpy.clip(bounce_pos, -limit, limit)
+
+    pos = numpy.where(crossed, numpy.where(outward, wall, bounce_pos), new_pos)
+    vel = numpy.where(crossed, numpy.where(outward, 0, bounce_vel), new_vel)
+    return pos, vel
@@ -0,0 +1,118 @@
+import math
+
+import numpy
+
+from source.settings import SYSTEM
+
+
+class Noise:
+
+    MODELS = "uniform", "gaussian", "pink", "brown", "quantization"
+
+    def __init__(self, model=SYSTEM.NOISE_MODEL, seed=None, n=None, block=SYSTEM.NOISE_BLOCK):
+        if model not in Noise.MODELS:
+            raise ValueError(f"Unknown noise model '{model}', expected one of {Noise.MODELS}")
+
+        self.model = model
+        self.generator = numpy.random.default_rng(seed)
+        self.n = n
+        self.block = block
+
+        self._samples = None
+        self._position = block
+        self._count = 0
+
+        self._rows = None
+        self._level = None
+
+    @property
+    def shape(self):
+        return (self.block,) if self.n is None else (self.block, self.n)
+
+    def spawn(self, count):
+        return [Noise(self.model, generator, self.n, self.block) for generator in self.generator.spawn(count)]
+
+    def sample(self):
+        if self._position == self.block:
+            samples = self.generate()
+            self._samples = samples.tolist() if self.n is None else samples
+            self._position = 0
+
+        sample = self._samples[self._position]
+        self._position += 1
+        return sample
+
+    def apply(self, value, amplitude):
+        if self.model != "quantization":
+            return value + self.sample() * amplitude
+
+        if self.n is None:
+            return round(value / amplitude) * amplitude if amplitude > 0 else value
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            return numpy.where(amplitude > 0, numpy.round(value / amplitude) * amplitude, value)
+
+    def generate(self):
+        if self.model == "uniform":
+            samples = self.generator.random(self.shape) * 2 - 1
+        elif self.model == "pink":
+            samples = self.pink()
+        elif self.model == "brown":
+            samples = self.brown()
+        elif self.model == "quantization":
+            samples = numpy.zeros(self.shape)
+        else:
+            samples = self.generator.standard_normal(self.shape)
+
+        self._count += self.block
+        return samples
+
+    def pink(self):
+        # Voss-McCartney: row r is redrawn every 2^(r+1) samples and held in between
+        rows = SYSTEM.NOISE_PINK_ROWS
+        if self._rows is None:
+            self._rows = self.generator.standard_normal((rows,) + self.shape[1:])
+
+        index = self._count + numpy.arange(self.block)
+        samples = self.generator.standard_normal(self.shape)
+
+        for row in range(rows):
+            updates = index % (2 << row) == 0
+            fresh = self.generator.standard_normal((int(updates.sum()),) + self.shape[1:])
+
+            held = numpy.concatenate((self._rows[row][None], fresh))[numpy.cumsum(updates)]
+            samples += held
+            self._rows[row] = held[-1]
+
+        return samples / numpy.sqrt(rows + 1)
+
+    def brown(self):
+        # Leaky random walk, unit variance; the recursion is unrolled with powers of the leak. The powers start over
+        # every chunk, and strong leaks get shorter chunks, so leak ** -k never grows past NOISE_BROWN_GROWTH
+        leak = SYSTEM.NOISE_BROWN_LEAK
+        if self._level is None:
+            self._level = self.generator.standard_normal(self.shape[1:])
+
+        white = self.generator.standard_normal(self.shape) * numpy.sqrt(1 - leak ** 2)
+        if leak == 0:
+            self._level = white[-1]
+            return white
+
+        chunk = SYSTEM.NOISE_BROWN_CHUNK
+        if leak < 1:
+            chunk = max(min(chunk, int(math.log(SYSTEM.NOISE_BROWN_GROWTH) / -math.log(leak))), 1)
+
+        powers = leak ** numpy.arange(1, chunk + 1)
+        if self.n is not None:
+            powers = powers[:, None]
+
+        samples = numpy.empty(self.shape)
+        level = self._level
+        for start in range(0, self.block, chunk):
+            part = white[start:start + chunk]
+            scale = powers[:len(part)]
+
+            samples[start:start + chunk] = scale * (level + numpy.cumsum(part / scale, axis=0))
+            level = samples[start + len(part) - 1]
+
+        self._level = level
+        return samples
@@ -0,0 +1,51 @@
+import hashlib
+import importlib.util
+import os
+
+from source.settings import SYSTEM
+
+_PLANTS = {}
+
+
+def model_key(name):
+    # The model file and the generator are hashed as text, which needs no SymPy. Line endings are normalized, so a
+    # checkout with CRLF endings still finds the committed modules
+    digest = hashlib.sha256(name.encode())
+    for path in (SYSTEM.MODEL_SOURCE, os.path.join(os.path.dirname(__file__), "codegen.py")):
+        with open(path, "rb") as file:
+            digest.update(file.read().replace(b"\r\n", b"\n"))
+    return digest.hexdigest()[:SYSTEM.MODEL_KEY_LENGTH]
+
+
+def load_plant(name):
+    plant = _PLANTS.get(name)
+    if plant is not None:
+        return plant
+
+    key = model_key(name)
+    path = os.path.join(SYSTEM.MODEL_DIR, f"{name}_{key}.py")
+
+    if not os.path.exists(path):
+        # Only a new or edited model pays for importing SymPy and deriving it
+        from source.codegen import write
+
+        spec = importlib.util.spec_from_file_location("system_model", SYSTEM.MODEL_SOURCE)
+        models = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(models)
+
+        if name not in models.MODELS:
+            raise ValueError(f"Unknown plant '{name}', expected one of {tuple(models.MODELS)}")
+        write(models.MODELS[name](), key, path)
+
+    spec = importlib.util.spec_from_file_location(f"plant_{name}", path)
+    plant = _PLANTS[name] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(plant)
+    return plant
+
+
+def load_rail_plant(name):
+    # The sandbox drives one body along the rail, models with more coordinates can be generated but not simulated
+    plant = load_plant(name)
+    if len(plant.COORDINATES) != 1:
+        raise ValueError(f"Plant '{name}' has coordinates {plant.COORDINATES}, only single coordinate plants run on the rail")
+    return plant
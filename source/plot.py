@@ -2,28 +2,96 @@ import numpy
 import pygame
 from pygame.math import Vector2 as Vector
 
-from source.settings import LAYOUT
-from source.widgets import Widget
+from source.settings import LAYOUT, SETTINGS
+from source.widgets import Widget, TEXT_CACHE
+
+
+def decimate(points, columns):
+    if len(points) <= columns * 2:
+        return points
+
+    # Keep the lowest and highest sample of every pixel column, in the order they occur
+    x, y = points[:, 0], points[:, 1]
+    bins = numpy.floor((x - x[0]) * (columns - 1) / max(x[-1] - x[0], 1e-12)).astype(numpy.int64)
+
+    starts = numpy.flatnonzero(numpy.diff(bins, prepend=-1))
+    counts = numpy.diff(starts, append=len(points))
+    indices = numpy.arange(len(points))
+
+    lows = numpy.minimum.reduceat(y, starts)
+    highs = numpy.maximum.reduceat(y, starts)
+    low_index = numpy.minimum.reduceat(numpy.where(y == numpy.repeat(lows, counts), indices, len(points)), starts)
+    high_index = numpy.minimum.reduceat(numpy.where(y == numpy.repeat(highs, counts), indices, len(points)), starts)
+
+    order = numpy.column_stack((numpy.minimum(low_index, high_index), numpy.maximum(low_index, high_index)))
+    return points[order.ravel()]
 
 
 class TimeSeries:
 
-    def __init__(self, name):
+    def __init__(self, name, capacity=256):
         self.name = name
-        self.time = numpy.array([], dtype=numpy.float32)
-        self.data = numpy.array([], dtype=numpy.float32)
+
+        self._capacity = max(int(capacity), 1)
+        self._time = numpy.zeros(self._capacity * 2, dtype=numpy.float64)
+        self._data = numpy.zeros(self._capacity * 2, dtype=numpy.float64)
+
+        self._start = 0
+        self._length = 0
 
     def __bool__(self):
-        return len(self.data) > 0
+        return self._length > 0
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def time(self):
+        return self._time[self._start:self._start + self._length]
+
+    @property
+    def data(self):
+        return self._data[self._start:self._start + self._length]
 
     def append(self, value, timestamp):
-        self.data = numpy.append(self.data, value)
-        self.time = numpy.append(self.time, timestamp)
+        if self._length == self._capacity:
+            self._grow()
+
+        # Every sample is written twice, so [start, start + length) is always a contiguous view
+        index = (self._start + self._length) % self._capacity
+        self._time[index] = self._time[index + self._capacity] = timestamp
+        self._data[index] = self._data[index + self._capacity] = value
+        self._length += 1
+
+    def extend(self, values, timestamps):
+        while self._length + len(values) > self._capacity:
+            self._grow()
+
+        index = (self._start + self._length + numpy.arange(len(values))) % self._capacity
+        self._time[index] = self._time[index + self._capacity] = timestamps
+        self._data[index] = self._data[index + self._capacity] = values
+        self._length += len(values)
 
     def filter(self, now, time_window):
-        mask = self.time > now - time_window
-        self.time = self.time[mask]
-        self.data = self.data[mask]
+        threshold = now - time_window
+        while self._length and self._time[self._start] <= threshold:
+            self._start = (self._start + 1) % self._capacity
+            self._length -= 1
+
+    def clear(self):
+        self._start = 0
+        self._length = 0
+
+    def _grow(self):
+        time, data = self.time.copy(), self.data.copy()
+
+        self._capacity *= 2
+        self._time = numpy.zeros(self._capacity * 2, dtype=numpy.float64)
+        self._data = numpy.zeros(self._capacity * 2, dtype=numpy.float64)
+
+        self._time[:self._length] = self._time[self._capacity:self._capacity + self._length] = time
+        self._data[:self._length] = self._data[self._capacity:self._capacity + self._length] = data
+        self._start = 0
 
     def scale(self, x_length, x_shift, y_length, y_shift, limits):
 
@@ -43,11 +111,14 @@ class TimeSeries:
 class Plotter(Widget):
 
     GAP = 16
+    HOVER_WINDOW = 8
+    HOVER_DISTANCE = 20
     ARROW_UP = (Vector(0, 0), Vector(-6, 20), Vector(8, 20))
     ARROW_RIGHT = (Vector(0, 0), Vector(-20, -6), Vector(-20, 6))
 
     def __init__(self, container, rect, color, signals, time_window, min_period=0, limits=None):
         super().__init__(container, rect, color)
+        self.name = f"Plotter[{', '.join(signals)}]"
         self.time_window = time_window
         self.min_period = min_period
 
@@ -58,106 +129,162 @@ class Plotter(Widget):
         self.floating = limits is None
 
         self.plot_switches = [True for _ in signals]
+        self.version = 0
+
+        self._axes = None
+        self._axes_key = None
+        self._legend = None
+        self._legend_key = None
         self.mouse_pos = Vector(0, 0)
-        self.mouse_pressed = pygame.mouse.get_pressed()
 
-        self.signals = {signal: TimeSeries(signal) for signal in signals}
+        capacity = time_window / min_period if min_period > 0 else time_window * SETTINGS.FPS
+        self.signals = {signal: TimeSeries(signal, capacity + 2) for signal in signals}
 
-        _, gap = self.font.size("X")
+        _, gap = TEXT_CACHE.size(self.font, "X")
         self.indicators = [
             pygame.Rect(self.border.left + Plotter.GAP * 1.5, self.border.top + (gap + Plotter.GAP) * index, gap, gap)
             for index, name in enumerate(self.signals)
         ]
 
-    def events(self, mouse_pos, mouse_pressed, key_pressed):
-        super().events(mouse_pos, mouse_pressed, key_pressed)
+    def on_hover(self, mouse_pos):
+        self.mouse_pos = mouse_pos
 
-        if mouse_pressed[0] and not self.mouse_pressed[0]:
-            for index, indicator_rect in enumerate(self.indicators):
-                if indicator_rect.collidepoint(mouse_pos):
-                    self.plot_switches[index] = not self.plot_switches[index]
+    def on_press(self, button, mouse_pos):
+        if button != 0:
+            return
 
-        self.mouse_pos = mouse_pos
-        self.mouse_pressed = mouse_pressed
+        for index, indicator_rect in enumerate(self.indicators):
+            if indicator_rect.collidepoint(mouse_pos):
+                self.plot_switches[index] = not self.plot_switches[index]
 
     def filter(self, now):
         for data in self.signals.values():
+            length = len(data)
             data.filter(now, self.time_window)
+            if len(data) != length:
+                self.version += 1
+
+    def clear(self):
+        for data in self.signals.values():
+            data.clear()
+        self.version += 1
 
     def register(self, key, value, now):
         signal = self.signals[key]
-        if not signal or now - self.signals[key].time[-1] >= self.min_period:
-            self.signals[key].append(value, now)
+        if not signal or now - signal.time[-1] >= self.min_period:
+            signal.append(value, now)
+            self.version += 1
+
+    def extend(self, key, values, timestamps):
+        if len(values):
+            self.signals[key].extend(values, timestamps)
+            self.version += 1
+
+    def load(self, key, values, timestamps):
+        signal = self.signals[key]
+        signal.clear()
+        signal.extend(values, timestamps)
+        self.version += 1
 
     def update_limits(self):
-        if any(self.plot_switches):
-            data = [series.data for index, series in enumerate(self.signals.values()) if self.plot_switches[index]]
+        data = [series.data for index, series in enumerate(self.signals.values()) if self.plot_switches[index] and series]
+        if data:
             low = float(numpy.min(numpy.min(data)))
             high = float(numpy.max(numpy.max(data)))
             self.limits = min(low, 0), max(high, 0)
         else:
             self.limits = -1, 1
 
-    def draw_axes(self, display):
+    def draw_axes(self, display, origin):
 
         low, high = self.limits
+        border = self.border.move(-origin[0], -origin[1])
 
         if low + high == 0:
-            y = self.border.centery
+            y = border.centery
         else:
-            y = self.border.bottom + (0 - low) * -self.border.height / (high - low)
-            y = min(max(y, self.border.top), self.border.bottom)
+            y = border.bottom + (0 - low) * -border.height / (high - low)
+            y = min(max(y, border.top), border.bottom)
 
-        x_start, x_end = (self.border.left, y), (self.border.right, y)
+        x_start, x_end = (border.left, y), (border.right, y)
 
-        pygame.draw.line(display, self.color[1], self.border.topleft, self.border.bottomleft, 1)
+        pygame.draw.line(display, self.color[1], border.topleft, border.bottomleft, 1)
         pygame.draw.line(display, self.color[1], x_start, x_end, 1)
         pygame.draw.polygon(display, self.color[1], tuple(point + x_end for point in Plotter.ARROW_RIGHT))
-        pygame.draw.polygon(display, self.color[1], tuple(point + self.border.topleft for point in Plotter.ARROW_UP))
+        pygame.draw.polygon(display, self.color[1], tuple(point + border.topleft for point in Plotter.ARROW_UP))
 
     def draw_data(self, display):
+        hovered = self.hovered and self.border.collidepoint(self.mouse_pos)
+        if hovered:
+            pygame.draw.line(display, self.color[3], (self.mouse_pos.x, self.border.top), (self.mouse_pos.x, self.border.bottom), 1)
+
+        drawn = []
+
         for signal_index, signal in enumerate(self.signals.values()):
 
             if len(signal.data) < 3 or not self.plot_switches[signal_index]:
                 continue
 
             points = signal.scale(*self.scaling, self.limits)
-            pygame.draw.lines(display, self.color[4][signal_index], False, tuple(map(tuple, points)), 2)
+            lines = decimate(points, self.border.width)
+            pygame.draw.lines(display, self.color[4][signal_index], False, lines.tolist(), 2)
 
-            label_surface = self.font.render(f"{signal.data[-1]:.3f}", True, self.color[4][signal_index])
+            label_surface = self.render_text(f"{signal.data[-1]:.3f}", self.color[4][signal_index])
             label_rect = label_surface.get_rect()
             label_rect.bottomright = points[-1]
 
             display.blit(label_surface, label_rect)
 
-            if not self.hovered:
-                continue
+            drawn.append((signal_index, signal, points))
 
-            min_distance = self.width * 2
-            closest_index = None
+        if hovered and drawn:
+            self.draw_hover(display, drawn)
 
-            for point_index, point in enumerate(points):
-                distance = self.mouse_pos.distance_to(point)
-                if distance < min_distance:
-                    min_distance = distance
-                    closest_index = point_index
+    def draw_hover(self, display, drawn):
+        min_distance = Plotter.HOVER_DISTANCE
+        closest_value = None
+        readouts = []
 
-            if min_distance > 20:
-                continue
+        for signal_index, signal, points in drawn:
+            # The time axis is monotonic, so the hovered column is a binary search away
+            index = int(numpy.searchsorted(points[:, 0], self.mouse_pos.x))
+            low, high = max(index - Plotter.HOVER_WINDOW, 0), min(index + Plotter.HOVER_WINDOW, len(points))
+
+            window = points[low:high]
+            distances = numpy.hypot(window[:, 0] - self.mouse_pos.x, window[:, 1] - self.mouse_pos.y)
+            nearest = int(numpy.argmin(distances))
+
+            if distances[nearest] < min_distance:
+                min_distance = distances[nearest]
+                closest_value = signal.data[low + nearest]
+
+            column = low + int(numpy.argmin(numpy.abs(window[:, 0] - self.mouse_pos.x)))
+            readouts.append((signal_index, signal.name, signal.time[column], signal.data[column]))
+
+        top = self.border.top
+        for position, (signal_index, name, time, value) in enumerate(readouts):
+            if position == 0:
+                time_surface = self.render_text(f"t = {time:.3f} s", self.color[2])
+                display.blit(time_surface, (self.mouse_pos.x + Plotter.GAP / 2, top))
+                top += time_surface.get_height()
+
+            readout_surface = self.render_text(f"{name}: {value:.3f}", self.color[4][signal_index])
+            display.blit(readout_surface, (self.mouse_pos.x + Plotter.GAP / 2, top))
+            top += readout_surface.get_height()
 
-            data_surface = self.font.render(f"y = {signal.data[closest_index]:.3f}", True, self.color[2])
+        if closest_value is not None:
+            data_surface = self.render_text(f"y = {closest_value:.3f}", self.color[2])
             data_rect = data_surface.get_rect()
             data_rect.bottomleft = self.mouse_pos
 
             display.blit(data_surface, data_rect)
 
-
-    def draw_legend(self, display):
+    def draw_legend(self, display, origin):
         for index, name in enumerate(self.signals):
-            text_surface = self.font.render(name, True, self.color[2])
+            text_surface = self.render_text(name, self.color[2])
             text_rect = text_surface.get_rect()
 
-            indicator_rect = self.indicators[index]
+            indicator_rect = self.indicators[index].move(-origin[0], -origin[1])
 
             text_rect.top = indicator_rect.top
             text_rect.left = indicator_rect.left + indicator_rect.width + Plotter.GAP
@@ -165,14 +292,35 @@ class Plotter(Widget):
             pygame.draw.rect(display, self.color[4][index], indicator_rect, 0 if self.plot_switches[index] else 1)
             display.blit(text_surface, text_rect)
 
-    def render(self, display):
+    def static_layers(self):
+        # Background with axes and the legend only change with the limits and the switches, so they are cached
+        if self._axes_key != self.limits:
+            self._axes_key = self.limits
+            self._axes = pygame.Surface(self.size)
+            self._axes.fill(self.color[0])
+            self.draw_axes(self._axes, self.topleft)
+
+        if self._legend_key != self.plot_switches:
+            self._legend_key = list(self.plot_switches)
+            self._legend = pygame.Surface(self.size, pygame.SRCALPHA)
+            self.draw_legend(self._legend, self.topleft)
 
-        pygame.draw.rect(display, self.color[0], self)
+        return self._axes, self._legend
 
+    def state(self):
         if self.floating:
             self.update_limits()
 
-        self.draw_axes(display)
-        self.draw_data(display)
-        self.draw_legend(display)
+        hover = (self.mouse_pos.x, self.mouse_pos.y) if self.hovered else None
+        return self.version, self.limits, tuple(self.plot_switches), hover
+
+    def render(self, display):
 
+        if self.floating:
+            self.update_limits()
+
+        axes, legend = self.static_layers()
+
+        display.blit(axes, self)
+        self.draw_data(display)
+        display.blit(legend, self)
@@ -0,0 +1,208 @@
+import json
+import os
+from time import perf_counter, strftime
+
+import numpy
+import pygame
+
+from source.settings import SETTINGS, LAYOUT
+from source.widgets import Widget, TEXT_CACHE
+
+
+class Profiler:
+
+    PHASES = "events", "update", "render", "work"
+    PERCENTILES = 50, 95, 99
+    S_TO_MS = 1000
+
+    def __init__(self, frames=SETTINGS.PROFILER_FRAMES):
+        self.enabled = False
+        self.frames = frames
+
+        self.frame_time = numpy.zeros(frames)
+        self.phases = {phase: numpy.zeros(frames) for phase in Profiler.PHASES}
+        self.items = {}
+        self.steps = numpy.zeros(frames, dtype=numpy.int64)
+
+        self.index = 0
+        self.count = 0
+        self.dropped_frames = 0
+        self.dropped_steps = 0
+
+        self._start = 0.0
+        self._mark = 0.0
+
+    @staticmethod
+    def label(item):
+        return getattr(item, "name", None) or type(item).__name__
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        if self.enabled:
+            self.clear()
+
+    def clear(self):
+        self.frame_time[:] = 0
+        self.steps[:] = 0
+        for ring in (*self.phases.values(), *self.items.values()):
+            ring[:] = 0
+
+        self.index = 0
+        self.count = 0
+        self.dropped_frames = 0
+        self.dropped_steps = 0
+
+    def begin(self, frame_time):
+        self.frame_time[self.index] = frame_time
+        if frame_time > SETTINGS.PROFILER_DROP_FACTOR / SETTINGS.FPS:
+            self.dropped_frames += 1
+
+        for ring in self.items.values():
+            ring[self.index] = 0
+
+        self._start = self._mark = perf_counter()
+
+    def mark(self, phase):
+        now = perf_counter()
+        self.phases[phase][self.index] = now - self._mark
+        self._mark = now
+
+    def item(self, item, seconds):
+        name = Profiler.label(item)
+        if name not in self.items:
+            self.items[name] = numpy.zeros(self.frames)
+        self.items[name][self.index] += seconds
+
+    def end(self, steps, dropped_steps):
+        self.phases["work"][self.index] = perf_counter() - self._start
+        self.steps[self.index] = steps
+        self.dropped_steps += dropped_steps
+
+        self.index = (self.index + 1) % self.frames
+        self.count = min(self.count + 1, self.frames)
+
+    def window(self, ring):
+        return ring if self.count == self.frames else ring[:self.count]
+
+    def percentiles(self, ring):
+        if not self.count:
+            return (0.0,) * len(Profiler.PERCENTILES)
+        return tuple(numpy.percentile(self.window(ring), Profiler.PERCENTILES) * Profiler.S_TO_MS)
+
+    def histogram(self, bins=SETTINGS.PROFILER_BINS):
+        counts, edges = numpy.histogram(self.window(self.frame_time) * Profiler.S_TO_MS, bins=bins)
+        return counts, edges
+
+    def slowest(self, count=3):
+        means = {name: float(self.window(ring).mean()) for name, ring in self.items.items()}
+        return sorted(means.items(), key=lambda pair: pair[1], reverse=True)[:count]
+
+    def summary(self):
+        if not self.count:
+            return "frame profiler: waiting for frames"
+
+        p50, p95, p99 = self.percentiles(self.frame_time)
+        events, update, render, _ = (float(self.window(ring).mean()) * Profiler.S_TO_MS for ring in self.phases.values())
+        slowest = "".join(f" | {name} {mean * Profiler.S_TO_MS:.2f}" for name, mean in self.slowest(1))
+
+        return (
+            f"frame {p50:.1f}/{p95:.1f}/{p99:.1f} ms | events {events:.2f} update {update:.2f} render {render:.2f} | "
+            f"{int(self.window(self.steps).mean())} steps, dropped {self.dropped_frames}f/{self.dropped_steps}s{slowest}"
+        )
+
+    def export(self, path=None):
+        path = path or os.path.join(SETTINGS.PROFILE_DIR, strftime("%Y%m%d-%H%M%S") + ".json")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        def stats(ring):
+            return dict(zip((f"p{p}_ms" for p in Profiler.PERCENTILES), self.percentiles(ring)),
+                        mean_ms=float(self.window(ring).mean()) * Profiler.S_TO_MS if self.count else 0.0)
+
+        counts, edges = self.histogram()
+        with open(path, "w") as file:
+            json.dump(dict(
+                frames=self.count,
+                target_fps=SETTINGS.FPS,
+                frame_time=stats(self.frame_time),
+                phases={phase: stats(ring) for phase, ring in self.phases.items()},
+                items={name: stats(ring) for name, ring in self.items.items()},
+                histogram=dict(edges_ms=edges.tolist(), counts=counts.tolist()),
+                steps=int(self.window(self.steps).sum()),
+                dropped_frames=self.dropped_frames,
+                dropped_steps=self.dropped_steps,
+            ), file, indent=4)
+
+        return path
+
+
+class FrameHistogram(Widget):
+
+    def __init__(self, container, rect, color, profiler):
+        super().__init__(container, rect, color)
+        self.profiler = profiler
+        self.counts = None
+        self.edges = None
+
+        border = self.inflate(-LAYOUT.GAP, -LAYOUT.GAP)
+        _, text_height = TEXT_CACHE.size(self.font, "X")
+        top = border.top + text_height + LAYOUT.GAP / 2
+
+        self.bars = pygame.Rect(border.left, top, border.width, border.bottom - top)
+        self.text_anchor = border.topleft
+
+    @property
+    def layer(self):
+        # Above the scene, the overlay sits in the left field
+        return 3
+
+    def refresh(self):
+        # Follows the text summary, so the bars only move every PROFILER_REFRESH frames
+        self.counts, self.edges = self.profiler.histogram() if self.profiler.count else (None, None)
+
+    def state(self):
+        return None if self.counts is None else (tuple(self.counts.tolist()), float(self.edges[0]), float(self.edges[-1]))
+
+    def render(self, display):
+        pygame.draw.rect(display, self.color[0], self)
+        pygame.draw.rect(display, self.color[1], self, 1)
+
+        if self.counts is None:
+            return
+
+        rect, counts, edges = self.bars, self.counts, self.edges
+        low, high = edges[0], max(edges[-1], edges[0] + 1e-9)
+
+        width = rect.width / len(counts)
+        for index, count in enumerate(counts):
+            height = count / counts.max() * (rect.height - 2)
+            pygame.draw.rect(display, self.color[4][0], (rect.left + index * width + 1, rect.bottom - 1 - height, width - 2, height))
+
+        # The frame budget, whatever lands right of it missed the target frame rate
+        budget = Profiler.S_TO_MS / SETTINGS.FPS
+        if low <= budget <= high:
+            x = rect.left + (budget - low) / (high - low) * rect.width
+            pygame.draw.line(display, self.color[4][1], (x, rect.top), (x, rect.bottom), 1)
+
+        display.blit(self.render_text(f"frame time {low:.1f} .. {high:.1f} ms", self.color[2]), self.text_anchor)
+
+
+class StartupTimer:
+
+    def __init__(self, start=None):
+        self.start = perf_counter() if start is None else start
+        self.marks = []
+
+    def mark(self, name):
+        self.marks.append((name, perf_counter() - self.start))
+
+    def report(self):
+        return "Startup: " + ", ".join(f"{name} {seconds * Profiler.S_TO_MS:.0f} ms" for name, seconds in self.marks)
+
+    def save(self, path=SETTINGS.STARTUP_LOG):
+        # One line per launch, so time-to-first-frame can be tracked across runs
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a") as file:
+                file.write(json.dumps(dict(time=strftime("%Y-%m-%d %H:%M:%S"), marks=dict(self.marks))) + "\n")
+        except OSError:
+            pass
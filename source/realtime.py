@@ -0,0 +1,205 @@
+from collections import deque
+from threading import Lock, Thread
+from time import perf_counter, sleep
+from typing import NamedTuple
+
+import numpy
+
+from source.settings import SETTINGS
+from source.simulation import FixedStep
+
+
+class Snapshot(NamedTuple):
+
+    now: float
+    pos: float
+    last_pos: float
+    angle: float
+    alpha: float
+    steps: int
+    dropped: int
+
+
+class SimulationThread:
+
+    def __init__(self, simulation, rate=SETTINGS.PHYSICS_RATE, max_steps=SETTINGS.MAX_PHYSICS_STEPS):
+        self.simulation = simulation
+        self.physics = FixedStep(rate, max_steps)
+        self.recorder = None
+
+        self.warp = SETTINGS.TIME_WARPS[0]
+        self.paused = False
+        self.next_plot = 0
+
+        # Commands come in and plot blocks go out through deques, whose append and popleft are atomic. The snapshot
+        # is immutable and replaced whole, so a reader always sees one consistent step
+        self.commands = deque()
+        self.blocks = deque()
+
+        # Only this thread touches an attached recorder. Detached ones are handed back for the frame to close, so the
+        # final write never blocks a step
+        self.finished = deque()
+        self.snapshot = self.take_snapshot()
+
+        # Only held around a batch of steps, for the changes that replace state instead of adjusting it
+        self.lock = Lock()
+        self.error = None
+
+        self._thread = None
+        self._running = False
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = Thread(target=self.run, name="simulation", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._running = False
+            self._thread.join()
+            self._thread = None
+
+    def reset(self, simulation):
+        with self.lock:
+            # Pending changes were meant for the old simulation. Recorders attached or detached by them are settled
+            # first, then whichever one was recording is let go, since a run never spans two simulations
+            for _, changes in self.commands:
+                if "recorder" in changes:
+                    self.attach(changes["recorder"])
+            self.commands.clear()
+            self.attach(None)
+
+            self.simulation = simulation
+            self.physics.accumulator = 0
+            self.next_plot = 0
+
+            self.blocks.clear()
+            self.snapshot = self.take_snapshot()
+
+    def send(self, changes):
+        self.commands.append((perf_counter(), changes))
+
+    def sync(self):
+        # Applies whatever is pending right away, for when no step is coming to apply it
+        with self.lock:
+            self.apply_commands(perf_counter())
+
+    def attach(self, recorder):
+        if self.recorder is not None:
+            self.finished.append(self.recorder)
+
+        # The whole configuration, so the run also knows the plant, integrator and noise model it was made with
+        self.recorder = recorder
+        if recorder is not None:
+            recorder.parameters(self.simulation.now, self.simulation.configuration())
+
+    def apply(self, changes):
+        simulation = self.simulation
+        parameters = {}
+
+        for name, value in changes.items():
+            if name == "reference":
+                simulation.reference.pos = value
+            elif name == "tilt":
+                simulation.system.tilt(value)
+            elif name == "warp":
+                self.warp = value
+            elif name == "paused":
+                self.paused = value
+            elif name == "recorder":
+                self.attach(value)
+            else:
+                parameters[name] = value
+
+        if parameters:
+            simulation.configure(**parameters)
+            if self.recorder is not None:
+                self.recorder.parameters(simulation.now, parameters)
+
+    def apply_commands(self, until):
+        commands = self.commands
+        while commands and commands[0][0] <= until:
+            self.apply(commands.popleft()[1])
+
+    def take_snapshot(self):
+        system, physics = self.simulation.system, self.physics
+        return Snapshot(
+            self.simulation.now, system.pos, system.last_pos, system.angle, physics.alpha, physics.steps, physics.dropped
+        )
+
+    def advance(self, elapsed, now=None):
+        now = perf_counter() if now is None else now
+
+        if self.warp is None and not self.paused:
+            self.advance_max(now + SETTINGS.WARP_MAX_SLICE)
+            return
+
+        with self.lock:
+            if self.paused:
+                self.apply_commands(now)
+            else:
+                self.simulate(self.physics.advance(elapsed, self.warp), now - elapsed, now)
+
+            self.snapshot = self.take_snapshot()
+
+    def advance_max(self, deadline):
+        # Maximum warp: simulate for a fixed slice of wall time in short chunks. The lock is let go between chunks and
+        # the commands are applied before each one, so a reset, a pause or a new warp never waits for the whole slice
+        while perf_counter() < deadline:
+            with self.lock:
+                self.apply_commands(perf_counter())
+                if self.warp is not None or self.paused:
+                    return
+
+                now = perf_counter()
+                self.simulate(SETTINGS.WARP_CHUNK, now, now)
+                self.physics.steps += SETTINGS.WARP_CHUNK
+                self.snapshot = self.take_snapshot()
+
+    def simulate(self, steps, start, end):
+        simulation, recorder, dt = self.simulation, self.recorder, self.physics.dt
+        span = (end - start) / steps if steps else 0.0
+        samples = []
+
+        for index in range(steps):
+            # Each command lands on the first step at or after the moment it was sent
+            if self.commands:
+                self.apply_commands(start + span * index)
+
+            simulation.step(dt)
+
+            if recorder is not None:
+                recorder.record(simulation)
+
+            # Plot samples are only taken every PLOT_SAMPLING_S and handed over in one block
+            if simulation.now >= self.next_plot:
+                self.next_plot = max(self.next_plot + SETTINGS.PLOT_SAMPLING_S, simulation.now)
+                samples.append((
+                    simulation.now, simulation.reference.pos, simulation.sensor.value,
+                    simulation.controller.error, simulation.actuator.value, simulation.controller.i_term,
+                ))
+
+        self.apply_commands(end)
+
+        if samples:
+            block = numpy.array(samples)
+            block.flags.writeable = False
+            self.blocks.append(block)
+
+    def run(self):
+        last = perf_counter()
+
+        try:
+            while self._running:
+                now = perf_counter()
+                self.advance(now - last, now)
+                last = now
+
+                sleep(max(SETTINGS.SIMULATION_TICK_S - (perf_counter() - now), 0))
+        except Exception as error:
+            self.error = error
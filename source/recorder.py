@@ -0,0 +1,157 @@
+import json
+import os
+from queue import SimpleQueue
+from threading import Thread
+from time import strftime
+
+import numpy
+
+from source.settings import SETTINGS
+from source.simulation import Simulation
+
+
+class Recorder:
+
+    VERSION = 2
+    DTYPE = numpy.dtype("<f8")
+    EVENT_DTYPE = numpy.dtype([("time", "<f8"), ("parameter", "<i4"), ("value", "<f8")])
+    COLUMNS = Simulation.SIGNALS + ("proportional", "integral", "derivative", "angle")
+
+    def __init__(self, path=None, block=SETTINGS.RECORDER_BLOCK):
+        self.path = path or os.path.join(SETTINGS.RECORDING_DIR, strftime("%Y%m%d-%H%M%S") + ".run")
+        os.makedirs(self.path, exist_ok=True)
+
+        self.parameter_names = tuple(Simulation.PARAMETERS)
+        self.choices = {}
+        Recorder.write_header(self.path, self.header())
+
+        self.block = block
+        self.samples = 0
+        self._buffer = numpy.zeros((len(Recorder.COLUMNS), block), dtype=Recorder.DTYPE)
+        self._row = 0
+
+        self._parameters = {}
+        self._events = []
+
+        self._queue = SimpleQueue()
+        self._thread = Thread(target=self._write, name="recorder", daemon=True)
+        self._thread.start()
+
+    def header(self):
+        return dict(
+            version=Recorder.VERSION,
+            dtype=Recorder.DTYPE.str,
+            columns=Recorder.COLUMNS,
+            event_dtype=Recorder.EVENT_DTYPE.descr,
+            parameters=self.parameter_names,
+            choices={name: list(choices) for name, choices in self.choices.items()},
+        )
+
+    @staticmethod
+    def write_header(path, header):
+        # Swapped in whole, so a replay opening the run never reads half a header
+        temporary = os.path.join(path, "header.json.tmp")
+        with open(temporary, "w") as file:
+            json.dump(header, file, indent=4)
+        os.replace(temporary, os.path.join(path, "header.json"))
+
+    @staticmethod
+    def sample(simulation):
+        controller = simulation.controller
+        return simulation.sample() + (
+            controller.error * controller.kp,
+            controller.i_term * controller.ki,
+            controller.d_term * controller.kd,
+            simulation.system.angle,
+        )
+
+    def record(self, simulation):
+        self._buffer[:, self._row] = Recorder.sample(simulation)
+        self._row += 1
+        self.samples += 1
+
+        if self._row == self.block:
+            self.flush()
+
+    def parameters(self, now, parameters):
+        for name, value in parameters.items():
+            if isinstance(value, str):
+                # Recorded as an index into a per parameter table in the header, which the writer rewrites when it grows
+                choices = self.choices.setdefault(name, [])
+                if value not in choices:
+                    choices.append(value)
+                    self._queue.put(("header", self.header()))
+                value = choices.index(value)
+            value = float(value)
+            if self._parameters.get(name) != value:
+                self._parameters[name] = value
+                self._events.append((now, self.parameter_names.index(name), value))
+
+    def flush(self):
+        if self._row:
+            self._queue.put(("columns", (self._buffer, self._row)))
+            self._buffer = numpy.zeros((len(Recorder.COLUMNS), self.block), dtype=Recorder.DTYPE)
+            self._row = 0
+
+        if self._events:
+            self._queue.put(("events", numpy.array(self._events, dtype=Recorder.EVENT_DTYPE)))
+            self._events = []
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+
+    def _write(self):
+        columns = [open(os.path.join(self.path, name + ".f8"), "ab") for name in Recorder.COLUMNS]
+        events = open(os.path.join(self.path, "parameters.bin"), "ab")
+
+        try:
+            while (item := self._queue.get()) is not None:
+                kind, payload = item
+                if kind == "header":
+                    Recorder.write_header(self.path, payload)
+                elif kind == "events":
+                    events.write(payload.tobytes())
+                else:
+                    block, rows = payload
+                    for file, column in zip(columns, block):
+                        file.write(column[:rows].tobytes())
+        finally:
+            for file in columns + [events]:
+                file.close()
+
+
+class Recording:
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(os.path.join(path, "header.json")) as file:
+            self.header = json.load(file)
+
+        self.columns = tuple(self.header["columns"])
+        self.parameter_names = tuple(self.header["parameters"])
+        self.choices = self.header.get("choices", {})
+        self.dtype = numpy.dtype(self.header["dtype"])
+
+        self._maps = {}
+        self.length = None
+        self.events = self._map("parameters.bin", numpy.dtype([tuple(field) for field in self.header["event_dtype"]]))
+
+        # A run that is still being written may have some columns one block ahead of others
+        self.length = min(len(self[name]) for name in self.columns)
+
+    def _map(self, name, dtype):
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path) or os.path.getsize(path) < dtype.itemsize:
+            return numpy.zeros(0, dtype=dtype)
+        return numpy.memmap(path, dtype=dtype, mode="r", shape=(os.path.getsize(path) // dtype.itemsize,))
+
+    def __getitem__(self, name):
+        if name not in self._maps:
+            self._maps[name] = self._map(name + ".f8", self.dtype)
+        return self._maps[name][:self.length]
+
+    def __len__(self):
+        return self.length
@@ -0,0 +1,101 @@
+from time import perf_counter
+
+import pygame
+
+from source.settings import COLORS
+
+
+class Layer:
+
+    def __init__(self, area, state, render, layer=1, name=None):
+        self.name = name
+        self.layer = layer
+        self.static = False
+
+        self._area = area
+        self._state = state
+        self._render = render
+
+    @property
+    def area(self):
+        return self._area()
+
+    def state(self):
+        return self._state()
+
+    def render(self, display):
+        self._render(display)
+
+
+class LayeredRenderer:
+
+    def __init__(self):
+        self.background = None
+        self.profiler = None
+
+        self._states = {}
+        self._areas = {}
+
+    def invalidate(self):
+        self.background = None
+
+    def build_background(self, display, items):
+        self.background = pygame.Surface(display.get_size())
+        self.background.fill(COLORS.BACKGROUND)
+
+        for item in items:
+            if item.static:
+                item.render(self.background)
+
+    def render(self, display, items):
+        items = sorted(items, key=lambda item: item.layer)
+        dynamic = [item for item in items if not item.static]
+
+        if self.background is None:
+            self.build_background(display, items)
+            display.blit(self.background, (0, 0))
+
+            for item in dynamic:
+                self.draw(display, item, item.state(), item.area)
+            return [display.get_rect()]
+
+        dirty = {}
+        rects = []
+
+        for item in dynamic:
+            state, area = item.state(), item.area
+            if state != self._states.get(id(item)) or area != self._areas.get(id(item)):
+                dirty[id(item)] = state, area
+                rects.append(area.union(self._areas.get(id(item), area)))
+
+        # Whatever overlaps a restored area has to be drawn again, in layer order
+        changed = bool(rects)
+        while changed:
+            changed = False
+            for item in dynamic:
+                if id(item) not in dirty and item.area.collidelist(rects) != -1:
+                    dirty[id(item)] = item.state(), item.area
+                    rects.append(item.area)
+                    changed = True
+
+        for rect in rects:
+            display.blit(self.background, rect, rect)
+
+        for item in dynamic:
+            if id(item) in dirty:
+                self.draw(display, item, *dirty[id(item)])
+
+        return rects
+
+    def draw(self, display, item, state, area):
+        display.set_clip(area)
+        if self.profiler is None:
+            item.render(display)
+        else:
+            start = perf_counter()
+            item.render(display)
+            self.profiler.item(item, perf_counter() - start)
+        display.set_clip(None)
+
+        self._states[id(item)] = state
+        self._areas[id(item)] = pygame.Rect(area)
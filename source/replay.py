@@ -0,0 +1,101 @@
+import numpy
+import pygame
+
+from source.recorder import Recording
+from source.settings import SETTINGS
+from source.widgets import Widget
+
+
+class Replay:
+
+    SPEED_LIMITS = 1 / 16, 64
+
+    def __init__(self, path):
+        self.recording = Recording(path)
+        self.time = self.recording["time"]
+
+        self.start = float(self.time[0]) if len(self.time) else 0.0
+        self.end = float(self.time[-1]) if len(self.time) else 0.0
+
+        self.now = self.start
+        self.speed = 1.0
+
+        # Every parameter's changes in time order, so a lookup is one binary search per parameter
+        events = self.recording.events
+        events = events[numpy.argsort(events["time"], kind="stable")]
+        self.changes = {}
+        for parameter, name in enumerate(self.recording.parameter_names):
+            changes = events[events["parameter"] == parameter]
+            if len(changes):
+                self.changes[name] = numpy.array(changes["time"]), numpy.array(changes["value"])
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    @property
+    def index(self):
+        return max(int(numpy.searchsorted(self.time, self.now, side="right")) - 1, 0)
+
+    def seek(self, now):
+        self.now = min(max(now, self.start), self.end)
+
+    def advance(self, dt):
+        self.seek(self.now + dt * self.speed)
+
+    def scale_speed(self, factor):
+        self.speed = min(max(self.speed * factor, Replay.SPEED_LIMITS[0]), Replay.SPEED_LIMITS[1])
+
+    def sample(self):
+        index = self.index
+        return {name: float(self.recording[name][index]) for name in self.recording.columns} if len(self.time) else {}
+
+    def window(self, column, length, period):
+        # One lookup per plotted sample, so only the pages inside the window are ever touched
+        period = max(period, 1 / SETTINGS.PHYSICS_RATE)
+        wanted = numpy.arange(self.now, max(self.now - length, self.start), -period)[::-1]
+        indices = numpy.unique(numpy.searchsorted(self.time, wanted, side="right") - 1)
+        indices = indices[indices >= 0]
+        return self.recording[column][indices], self.time[indices]
+
+    def parameters(self):
+        choices = self.recording.choices
+
+        parameters = {}
+        for name, (times, values) in self.changes.items():
+            index = int(numpy.searchsorted(times, self.now, side="right")) - 1
+            if index >= 0:
+                value = values[index]
+                parameters[name] = choices[name][int(value)] if name in choices else float(value)
+        return parameters
+
+
+class Timeline(Widget):
+
+    def __init__(self, container, rect, color, replay):
+        super().__init__(container, rect, color)
+        self.replay = replay
+
+    @property
+    def layer(self):
+        return 2
+
+    def on_drag(self, mouse_pos):
+        fraction = min(max((mouse_pos.x - self.left) / self.width, 0), 1)
+        self.replay.seek(self.replay.start + fraction * self.replay.duration)
+
+    def on_wheel(self, amount):
+        self.replay.scale_speed(2.0 ** numpy.sign(amount))
+
+    def state(self):
+        return self.replay.now, self.replay.speed, self.hovered or self.held
+
+    def render(self, display):
+        fraction = (self.replay.now - self.replay.start) / self.replay.duration if self.replay.duration else 0
+
+        pygame.draw.rect(display, self.color[0], self)
+        pygame.draw.rect(display, self.color[1][self.hovered or self.held], (self.left, self.top, self.width * fraction, self.height))
+
+        text = f"{self.replay.now:.2f} / {self.replay.end:.2f} s   {self.replay.speed:g}x"
+        surface = self.render_text(text, self.color[2])
+        display.blit(surface, surface.get_rect(center=self.center))
@@ -0,0 +1,213 @@
+from concurrent.futures import as_completed
+
+import numpy
+import pygame
+
+from source.batch import BatchSimulation
+from source.settings import ROBUSTNESS, SYSTEM, TUNING, LAYOUT
+from source.tuning import costs, in_background, process_pool
+from source.widgets import Widget, TEXT_CACHE
+
+
+def simulate(duration, dt, reference, seed, fixed, draws):
+    n = len(next(iter(draws.values())))
+    angle = draws.pop("angle")
+    simulation = BatchSimulation(n, reference=reference, angle=angle, seed=seed, **fixed, **draws)
+
+    n_steps = int(round(duration / dt))
+    recorded = numpy.linspace(0, n_steps - 1, ROBUSTNESS.ENVELOPE_POINTS).round().astype(int)
+    result = costs(simulation, duration, dt, reference, recorded, int(n_steps * (1 - ROBUSTNESS.SETTLED_FRACTION)))
+
+    # A loop that has not settled into the band by the end of the run is counted as unstable
+    late_error = result["late_error"]
+    unstable = ~numpy.isfinite(late_error) | (late_error > ROBUSTNESS.UNSTABLE_BAND * max(abs(reference), 1e-9))
+
+    return dict(position=result["position"], cost=result["itae"], unstable=unstable, rail=result["rail"])
+
+
+class RobustnessResult:
+
+    def __init__(self, time, position, cost, unstable, rail, total):
+        self.time = time
+        self.runs = len(cost)
+        self.total = total
+
+        self.envelope = numpy.nanpercentile(position, ROBUSTNESS.PERCENTILES, axis=1) if self.runs else None
+        self.cost = cost
+        self.cost_percentiles = numpy.percentile(cost, ROBUSTNESS.PERCENTILES) if self.runs else None
+
+        self.p_unstable = float(unstable.mean()) if self.runs else 0.0
+        self.p_rail = float(rail.mean()) if self.runs else 0.0
+
+    @property
+    def done(self):
+        return self.runs == self.total
+
+    def summary(self):
+        if not self.runs:
+            return f"Monte Carlo: 0 / {self.total} runs"
+
+        low, median, high = self.cost_percentiles[[0, len(ROBUSTNESS.PERCENTILES) // 2, -1]]
+        return (
+            f"Monte Carlo: {self.runs} / {self.total} runs | P(unstable) {self.p_unstable:.1%} | "
+            f"P(rail) {self.p_rail:.1%} | ITAE p{ROBUSTNESS.PERCENTILES[0]} {low:.3g} "
+            f"p50 {median:.3g} p{ROBUSTNESS.PERCENTILES[-1]} {high:.3g}"
+        )
+
+
+class Robustness:
+
+    def __init__(self, samples=ROBUSTNESS.SAMPLES, duration=ROBUSTNESS.DURATION_S, dt=ROBUSTNESS.STEP_S,
+                 reference=TUNING.REFERENCE, seed=0, workers=None, chunk_size=ROBUSTNESS.CHUNK_SIZE,
+                 mass=SYSTEM.MASS, damping=SYSTEM.DAMPING, angle=0, **fixed):
+        self.samples = samples
+        self.duration = duration
+        self.dt = dt
+        self.reference = reference
+        self.seed = seed
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+        self.mass = mass
+        self.damping = damping
+        self.angle = angle
+
+        self.nominal = {name: fixed.pop(name, 0.0) for name in ("actuator_delay", "sensor_delay", "sensor_noise")}
+        self.fixed = fixed
+
+        self.time = numpy.linspace(0, int(round(duration / dt)) - 1, ROBUSTNESS.ENVELOPE_POINTS).round() * dt + dt
+        self.latest = RobustnessResult(self.time, numpy.zeros((len(self.time), 0)), *numpy.zeros((3, 0)), samples)
+
+    def draw(self, n, generator):
+        # Mass, damping and noise are log-normal so they stay positive, delays jitter upwards from their nominal value
+        return dict(
+            mass=self.mass * numpy.exp(generator.normal(0, ROBUSTNESS.MASS_SPREAD, n)),
+            damping=self.damping * numpy.exp(generator.normal(0, ROBUSTNESS.DAMPING_SPREAD, n)),
+            actuator_delay=self.nominal["actuator_delay"] + generator.uniform(0, ROBUSTNESS.DELAY_JITTER_S, n),
+            sensor_delay=self.nominal["sensor_delay"] + generator.uniform(0, ROBUSTNESS.DELAY_JITTER_S, n),
+            sensor_noise=self.nominal["sensor_noise"] * numpy.exp(generator.normal(0, ROBUSTNESS.NOISE_SPREAD, n)),
+            angle=self.angle + numpy.radians(generator.normal(0, ROBUSTNESS.ANGLE_SPREAD_DEG, n)),
+        )
+
+    def run(self):
+        sequence = numpy.random.SeedSequence(self.seed)
+        generator = numpy.random.default_rng(sequence.spawn(1)[0])
+
+        starts = range(0, self.samples, self.chunk_size)
+        seeds = sequence.spawn(len(starts))
+        results = []
+
+        with process_pool(self.workers) as pool:
+            futures = [
+                pool.submit(
+                    simulate, self.duration, self.dt, self.reference, seed, self.fixed,
+                    self.draw(min(self.chunk_size, self.samples - start), generator),
+                )
+                for start, seed in zip(starts, seeds)
+            ]
+
+            # Every finished chunk publishes a new result, so a viewer sees the envelopes converge
+            for future in as_completed(futures):
+                results.append(future.result())
+                self.latest = RobustnessResult(
+                    self.time,
+                    numpy.concatenate([result["position"] for result in results], axis=1),
+                    numpy.concatenate([result["cost"] for result in results]),
+                    numpy.concatenate([result["unstable"] for result in results]),
+                    numpy.concatenate([result["rail"] for result in results]),
+                    self.samples,
+                )
+
+        return self.latest
+
+    def start(self):
+        return in_background(self.run)
+
+
+class FanChart(Widget):
+
+    def __init__(self, container, rect, color):
+        super().__init__(container, rect, color)
+        self.robustness = None
+
+        border = self.inflate(-LAYOUT.GAP * 2, -LAYOUT.GAP * 2)
+        _, text_height = TEXT_CACHE.size(self.font, "X")
+        top = border.top + text_height + LAYOUT.GAP
+
+        histogram_height = (border.bottom - top) * ROBUSTNESS.HISTOGRAM_HEIGHT
+        self.chart = pygame.Rect(border.left, top, border.width, border.bottom - top - histogram_height - LAYOUT.GAP)
+        self.histogram = pygame.Rect(border.left, self.chart.bottom + LAYOUT.GAP, border.width, histogram_height)
+
+        self.text_anchor = border.topleft
+
+    @property
+    def layer(self):
+        return 2
+
+    @property
+    def result(self):
+        return None if self.robustness is None else self.robustness.latest
+
+    def state(self):
+        result = self.result
+        return None if result is None else (id(result), result.runs)
+
+    def draw_fan(self, display, result):
+        rect = self.chart
+        low, high = -SYSTEM.RAIL_LENGTH / 2, SYSTEM.RAIL_LENGTH / 2
+
+        x = rect.left + (result.time - result.time[0]) / (result.time[-1] - result.time[0]) * rect.width
+
+        def y(values):
+            return rect.bottom - (numpy.clip(values, low, high) - low) / (high - low) * rect.height
+
+        pygame.draw.rect(display, self.color[1], rect, 1)
+        for level in (0, self.robustness.reference):
+            pygame.draw.line(display, self.color[3], (rect.left, y(level)), (rect.right, y(level)), 1)
+
+        # Bands from the outermost percentile pair inwards, the median on top
+        envelope = result.envelope
+        count = len(envelope)
+        for band in range(count // 2):
+            upper, lower = y(envelope[count - 1 - band]), y(envelope[band])
+            polygon = numpy.concatenate((numpy.column_stack((x, upper)), numpy.column_stack((x, lower))[::-1]))
+            pygame.draw.polygon(display, self.color[4][band % (len(self.color[4]) - 1)], polygon.tolist())
+
+        pygame.draw.lines(display, self.color[4][-1], False, numpy.column_stack((x, y(envelope[count // 2]))).tolist(), 2)
+
+        percentiles = ROBUSTNESS.PERCENTILES
+        bands = ", ".join(f"p{percentiles[band]}-p{percentiles[count - 1 - band]}" for band in range(count // 2))
+        display.blit(self.render_text(f"Position: {bands}, median", self.color[2]), (rect.left + 4, rect.top + 4))
+
+    def draw_histogram(self, display, result):
+        rect = self.histogram
+        pygame.draw.rect(display, self.color[1], rect, 1)
+
+        finite = result.cost[numpy.isfinite(result.cost)]
+        if not len(finite):
+            return
+
+        # Clipped at the high percentile of the finite costs, so a few diverged runs do not squash the distribution
+        top = max(numpy.percentile(finite, ROBUSTNESS.PERCENTILES[-1]), finite.min() + 1e-12)
+        counts, edges = numpy.histogram(numpy.minimum(finite, top), bins=ROBUSTNESS.HISTOGRAM_BINS, range=(finite.min(), top))
+
+        width = rect.width / len(counts)
+        for index, count in enumerate(counts):
+            height = count / counts.max() * (rect.height - 2)
+            pygame.draw.rect(display, self.color[4][-1], (rect.left + index * width + 1, rect.bottom - 1 - height, width - 2, height))
+
+        display.blit(self.render_text(f"ITAE {edges[0]:.3g} .. {edges[-1]:.3g}", self.color[2]), (rect.left + 4, rect.top + 4))
+
+    def render(self, display):
+        pygame.draw.rect(display, self.color[0], self)
+
+        result = self.result
+        if result is None:
+            return
+
+        display.blit(self.render_text(result.summary(), self.color[2]), self.text_anchor)
+        if result.runs:
+            display.set_clip(self.chart.clip(display.get_clip()))
+            self.draw_fan(display, result)
+            display.set_clip(self)
+            self.draw_histogram(display, result)
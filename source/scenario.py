@@ -0,0 +1,158 @@
+import json
+import os
+import tomllib
+from time import perf_counter
+
+import numpy
+
+from source.recorder import Recorder
+from source.settings import SETTINGS, SYSTEM, TUNING
+from source.simulation import Simulation
+
+
+class Profile:
+
+    KINDS = "constant", "steps", "linear", "sine"
+
+    def __init__(self, kind="constant", value=0.0, points=(), amplitude=0.0, frequency=0.0, offset=0.0, phase=0.0):
+        if kind not in Profile.KINDS:
+            raise ValueError(f"Unknown profile '{kind}', expected one of {Profile.KINDS}")
+
+        self.kind = kind
+        self.value = value
+        self.points = numpy.array(points, dtype=numpy.float64).reshape(-1, 2)
+        self.amplitude = amplitude
+        self.frequency = frequency
+        self.offset = offset
+        self.phase = phase
+
+        if kind in ("steps", "linear") and not len(self.points):
+            raise ValueError(f"A '{kind}' profile needs at least one [time, value] point")
+
+    @classmethod
+    def parse(cls, description):
+        if isinstance(description, (int, float)):
+            return cls(value=float(description))
+        description = dict(description)
+        return cls(description.pop("type", "constant"), **description)
+
+    def __call__(self, time):
+        time = numpy.asarray(time, dtype=numpy.float64)
+
+        if self.kind == "steps":
+            index = numpy.searchsorted(self.points[:, 0], time, side="right") - 1
+            # Until the first step the profile holds its initial value
+            return numpy.where(index >= 0, self.points[numpy.maximum(index, 0), 1], self.value)
+        if self.kind == "linear":
+            return numpy.interp(time, self.points[:, 0], self.points[:, 1])
+        if self.kind == "sine":
+            return self.offset + self.amplitude * numpy.sin(2 * numpy.pi * self.frequency * time + self.phase)
+        return numpy.full_like(time, self.value)
+
+
+class Scenario:
+
+    # Scenario sections and keys, mapped to Simulation parameters
+    SECTIONS = {
+        "plant": dict(model="plant", mass="mass", damping="damping", integrator="integrator"),
+        "controller": dict(kp="kp", ki="ki", kd="kd", nd="nd", limit="limit", anti_windup="anti_windup"),
+        "sensor": dict(delay="sensor_delay", noise="sensor_noise", filter="sensor_filter", noise_model="sensor_noise_model"),
+        "actuator": dict(delay="actuator_delay", limit="actuator_limit"),
+    }
+    METRICS = "ise", "itae", "overshoot", "settling", "final_error", "rail_contact"
+
+    def __init__(self, name, duration, dt=1 / SETTINGS.PHYSICS_RATE, seed=0, parameters=None,
+                 reference=None, angle=None, expect=None):
+        self.name = name
+        self.duration = duration
+        self.dt = dt
+        self.seed = seed
+        self.parameters = dict(parameters or {})
+        self.reference = reference or Profile()
+        self.angle = angle or Profile()
+        self.expect = dict(expect or {})
+
+        unknown = set(self.expect) - set(Scenario.METRICS)
+        if unknown:
+            raise ValueError(f"Unknown expectations {sorted(unknown)}, expected some of {Scenario.METRICS}")
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            description = json.load(file) if path.endswith(".json") else tomllib.load(file)
+
+        parameters = {}
+        for section, keys in Scenario.SECTIONS.items():
+            values = description.pop(section, {})
+            unknown = set(values) - set(keys)
+            if unknown:
+                raise ValueError(f"Unknown keys {sorted(unknown)} in [{section}], expected some of {tuple(keys)}")
+            parameters.update({keys[key]: value for key, value in values.items()})
+
+        reference = Profile.parse(description.pop("reference", 0.0))
+        angle = Profile.parse(description.pop("angle", 0.0))
+
+        name = description.pop("name", os.path.splitext(os.path.basename(path))[0])
+        return cls(name, parameters=parameters, reference=reference, angle=angle, **description)
+
+    def run(self):
+        simulation = Simulation(seed=self.seed, **self.parameters)
+        n_steps = int(round(self.duration / self.dt))
+
+        time = numpy.arange(1, n_steps + 1) * self.dt
+        references = self.reference(time)
+        angles = numpy.radians(self.angle(time))
+
+        columns = numpy.zeros((len(Recorder.COLUMNS), n_steps))
+        for index in range(n_steps):
+            simulation.reference.pos = references[index]
+            simulation.system.tilt(angles[index])
+            simulation.step(self.dt)
+            columns[:, index] = Recorder.sample(simulation)
+
+        return dict(zip(Recorder.COLUMNS, columns))
+
+    def summarize(self, columns):
+        time, reference, position = columns["time"], columns["reference"], columns["position"]
+        error = reference - position
+        band = TUNING.SETTLING_BAND * max(numpy.abs(reference).max(), 1e-9)
+
+        # Overshoot past the final reference, relative to the distance travelled to get there
+        final = reference[-1]
+        move = final - position[0]
+        sign = 1 if move >= 0 else -1
+        settled = numpy.nonzero(numpy.abs(error) > band)[0]
+
+        return dict(
+            ise=float(numpy.sum(error ** 2) * self.dt),
+            itae=float(numpy.sum(time * numpy.abs(error)) * self.dt),
+            overshoot=float(max(numpy.max((position - final) * sign), 0) / abs(move)) if abs(move) > band else 0.0,
+            settling=float(time[settled[-1]]) if len(settled) else 0.0,
+            final_error=float(abs(error[-1])),
+            rail_contact=bool(numpy.any(numpy.abs(position) >= SYSTEM.RAIL_LENGTH / 2)),
+        )
+
+    def check(self, summary):
+        return [
+            f"{metric} {summary[metric]:g} > {limit:g}" for metric, limit in self.expect.items()
+            if not summary[metric] <= limit
+        ]
+
+
+def run_file(path, output):
+    start = perf_counter()
+
+    try:
+        scenario = Scenario.load(path)
+        columns = scenario.run()
+    except Exception as error:
+        return dict(name=os.path.basename(path), path=path, status="error", message=f"{type(error).__name__}: {error}")
+
+    numpy.savez_compressed(os.path.join(output, scenario.name + ".npz"), **columns)
+
+    summary = scenario.summarize(columns)
+    failures = scenario.check(summary)
+    return dict(
+        name=scenario.name, path=path, status="fail" if failures else "ok", message="; ".join(failures),
+        steps=len(columns["time"]), seconds=perf_counter() - start, **summary,
+    )
@@ -1,9 +1,20 @@
+import os
+
 import pygame
 
 
 class SETTINGS:
 
     FPS = 120
+    PHYSICS_RATE = 960  # Hz
+    MAX_PHYSICS_STEPS = 96  # per rendered frame
+
+    TIME_WARPS = 1, 10, 100, None  # None runs as fast as possible
+    WARP_RENDER_FPS = 30  # rendering is throttled to this while warping
+    WARP_MAX_SLICE = 0.05  # s of wall time simulated between frames at maximum warp
+    WARP_CHUNK = 256  # steps between deadline checks at maximum warp
+    SIMULATION_THREAD = True  # step the simulation on its own thread instead of once per rendered frame
+    SIMULATION_TICK_S = 0.002  # wake-up period of the simulation thread
     DISPLAY_FLAGS = pygame.FULLSCREEN | pygame.HWACCEL
 
     SCALE = 240  # pixels / meter
@@ -12,6 +23,24 @@ class SETTINGS:
     PLOT_TIME_BUFFER_S = 3.0
     PLOT_SAMPLING_S = 0.01
 
+    TEXT_CACHE_BYTES = 8 * 1024 * 1024
+    EVENT_GRID_CELL = 64  # pixels per side of a cell in the widget event index
+
+    FONT = "monospace"
+    SYSTEM_FONTS = True  # False skips font matching and uses the font bundled with pygame
+    FONT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "pid-sandbox", "fonts.json")
+    STARTUP_LOG = os.path.join("profiles", "startup.jsonl")
+
+    RECORDING_DIR = "recordings"
+    RECORDER_BLOCK = 8192  # samples per column write
+    RESULTS_DIR = "results"  # scenario runner output
+
+    PROFILE_DIR = "profiles"
+    PROFILER_FRAMES = 600  # rolling window
+    PROFILER_BINS = 20
+    PROFILER_DROP_FACTOR = 1.5  # frames longer than this many frame periods count as dropped
+    PROFILER_REFRESH = 30  # frames between overlay updates
+
 
 class DARK:
 
@@ -30,12 +59,18 @@ class DARK:
     BLUE_PLOT = 60, 60, 230
     YELLOW_PLOT = 160, 160, 0
     CYAN_PLOT = 0, 140, 160
+    FAN_OUTER = 25, 30, 60
+    FAN_INNER = 40, 50, 110
 
     LABEL = 160, 160, 160
+    TIMELINE = RAIL, (HANDLE_INACTIVE, HANDLE_ACTIVE), LABEL
     TUNER = ((100, 100, 100), (120, 120, 120)), ((150, 0, 0), (200, 50, 50))
     SETTING = ((100, 100, 100), (120, 120, 120)), ((70, 70, 220), (80, 80, 250))
     TOP_PLOTTER = FIELD, PLOT_AXIS, LABEL, PLOT_CROSS, (GREEN_PLOT, RED_PLOT)
     BOT_PLOTTER = FIELD, PLOT_AXIS, LABEL, PLOT_CROSS, (CYAN_PLOT, BLUE_PLOT, YELLOW_PLOT)
+    ANALYSIS = FIELD, PLOT_AXIS, LABEL, PLOT_CROSS, (RED_PLOT, BLUE_PLOT, GREEN_PLOT)
+    FAN_CHART = FIELD, PLOT_AXIS, LABEL, PLOT_CROSS, (FAN_OUTER, FAN_INNER, BLUE_PLOT)
+    PROFILER = FIELD, PLOT_AXIS, LABEL, PLOT_CROSS, (CYAN_PLOT, RED_PLOT)
 
 
 class LIGHT:
@@ -55,12 +90,18 @@ class LIGHT:
     BLUE_PLOT = 140, 160, 230
     YELLOW_PLOT = 220, 220, 100
     CYAN_PLOT = 100, 200, 200
+    FAN_OUTER = 225, 230, 250
+    FAN_INNER = 195, 205, 245
 
     LABEL = 100, 100, 100
+    TIMELINE = RAIL, (HANDLE_INACTIVE, HANDLE_ACTIVE), LABEL
     TUNER = ((180, 180, 180), (200, 200, 200)), ((200, 120, 120), (230, 160, 160))
     SETTING = ((180, 180, 180), (200, 200, 200)), ((150, 150, 230), (170, 170, 250))
     TOP_PLOTTER = FIELD, PLOT_AXIS, LABEL, PLOT_CROSS, (GREEN_PLOT, RED_PLOT)
     BOT_PLOTTER = FIELD, PLOT_AXIS, LABEL, PLOT_CROSS, (CYAN_PLOT, BLUE_PLOT, YELLOW_PLOT)
+    ANALYSIS = FIELD, PLOT_AXIS, LABEL, PLOT_CROSS, (RED_PLOT, BLUE_PLOT, GREEN_PLOT)
+    FAN_CHART = FIELD, PLOT_AXIS, LABEL, PLOT_CROSS, (FAN_OUTER, FAN_INNER, BLUE_PLOT)
+    PROFILER = FIELD, PLOT_AXIS, LABEL, PLOT_CROSS, (CYAN_PLOT, RED_PLOT)
 
 
 COLORS = DARK
@@ -79,6 +120,7 @@ class LAYOUT:
     BOTTOM_FIELD = GAP, FIELD_SIZE + GAP * 2, WINDOW_WIDTH - GAP * 2, WINDOW_HEIGHT - FIELD_SIZE - GAP * 3
 
     SYSTEM_CENTER = FIELD_SIZE / 2 + GAP, FIELD_SIZE / 2 + GAP
+    TIMELINE = GAP * 2, FIELD_SIZE - GAP * 2, FIELD_SIZE - GAP * 2, 30
 
     CONTROLLER_TEXT = BOTTOM_FIELD[0] + GAP, BOTTOM_FIELD[1] + GAP
     CONTROLLER_LEFT = 180
@@ -100,11 +142,19 @@ class LAYOUT:
     ACTUATOR_DELAY = GAP * 2 + ACTUATOR_LEFT, WINDOW_HEIGHT - GAP * 2 - 0
     ACTUATOR_LIMIT = GAP * 2 + ACTUATOR_LEFT, WINDOW_HEIGHT - GAP * 2 - 30
 
+    TUNING_LEFT = ACTUATOR_LEFT + 300
+    TUNING_TEXT = BOTTOM_FIELD[0] + GAP + TUNING_LEFT, BOTTOM_FIELD[1] + GAP
+    WARP_TEXT = GAP * 2 + TUNING_LEFT, WINDOW_HEIGHT - GAP * 2
+
     PLOT_WIDTH, PLOT_HEIGHT = RIGHT_FIELD[2] - GAP * 2, (RIGHT_FIELD[3] - GAP * 3) / 2
 
     TOP_PLOT = RIGHT_FIELD[0] + GAP, RIGHT_FIELD[1] + GAP, PLOT_WIDTH, PLOT_HEIGHT
     BOT_PLOT = RIGHT_FIELD[0] + GAP, TOP_PLOT[1] + TOP_PLOT[3] + GAP, PLOT_WIDTH, PLOT_HEIGHT
 
+    ANALYSIS = RIGHT_FIELD
+    FAN_CHART = RIGHT_FIELD
+    PROFILER = GAP * 2, GAP * 4, 400, 160
+
 
 class SYSTEM:
 
@@ -119,7 +169,88 @@ class SYSTEM:
     RAIL_WIDTH = 0.02
 
     HANDLE_SIZE = 0.04
+    ANGLE_TIME_CONSTANT = 0.075  # s
+
+    INTEGRATOR = "symplectic"  # euler, symplectic, semi_implicit, rk4, rk45, exact
+    INTEGRATOR_RTOL = 1e-6
+    INTEGRATOR_ATOL = 1e-9
+    INTEGRATOR_MAX_SUBSTEPS = 1000
+    EVENT_ITERATIONS = 12
+    EXACT_FALLBACK = "rk45"  # used by the exact integrator while the angle moves or at the rail ends
+    EXACT_ANGLE_TOLERANCE = 1e-9  # rad
+    ZOH_CACHE_SIZE = 64
+
+    PLANT = "cart"  # cart, rolling_ball, or any single coordinate model in system_model.py
+    MODEL_SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "system_model.py")
+    MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generated")  # code generated from the models
+    MODEL_KEY_LENGTH = 16
+
+    DELAY_CAPACITY = 1024  # samples, grows on demand
+    DELAY_SLEW = 0.5  # samples of delay change per sample
+
+    NOISE_MODEL = "uniform"  # uniform, gaussian, pink, brown, quantization
+    NOISE_BLOCK = 4096  # samples generated at once
+    NOISE_PINK_ROWS = 16
+    NOISE_BROWN_LEAK = 0.998
+    NOISE_BROWN_CHUNK = 256  # samples unrolled per power series
+    NOISE_BROWN_GROWTH = 1e6  # largest leak ** -k allowed inside one chunk
 
     KP = 0
     KI = 0
-    KD = 0
\ No newline at end of file
+    KD = 0
+    ND = 1000
+
+
+class ANALYSIS:
+
+    FREQUENCY_RANGE = -2, 3  # decades of rad/s
+    POINTS = 512
+    DELAY_MODELS = "exact", "pade"
+    DELAY_MODEL = "exact"
+    PADE_ORDER = 4
+    BANDWIDTH_DB = -3
+    STABILITY_TOLERANCE = 1e-9
+    CACHE_SIZE = 256  # parameter sets
+
+    MAGNITUDE_RANGE = -80, 80  # dB
+    PHASE_RANGE = -540, 90  # degrees
+    NYQUIST_RANGE = 3  # half width of the Nyquist view
+    NYQUIST_WIDTH = 0.45  # of the panel width at most
+
+
+class ROBUSTNESS:
+
+    SAMPLES = 4096
+    CHUNK_SIZE = 256  # simulations per worker task
+    DURATION_S = 5.0
+    STEP_S = 1 / SETTINGS.PHYSICS_RATE
+
+    MASS_SPREAD = 0.2  # log-normal sigma
+    DAMPING_SPREAD = 0.3  # log-normal sigma
+    NOISE_SPREAD = 0.3  # log-normal sigma
+    DELAY_JITTER_S = 0.01  # uniform, added to the nominal delays
+    ANGLE_SPREAD_DEG = 1.0  # normal sigma
+
+    ENVELOPE_POINTS = 250
+    PERCENTILES = 5, 25, 50, 75, 95
+    SETTLED_FRACTION = 0.2  # of the run, at the end
+    UNSTABLE_BAND = 0.1  # of the reference, still exceeded at the end of the run
+
+    HISTOGRAM_HEIGHT = 0.25  # of the chart
+    HISTOGRAM_BINS = 40
+
+
+class TUNING:
+
+    COST = "itae"
+    DURATION_S = 5.0
+    STEP_S = 1 / SETTINGS.PHYSICS_RATE
+    REFERENCE = 1.0
+    SETTLING_BAND = 0.02
+
+    CANDIDATES = 2048
+    ROUNDS = 3
+    KEEP = 8
+    CHUNK_SIZE = 256
+
+    RANGES = dict(kp=(0, 100), ki=(0, 20), kd=(0, 20))
@@ -0,0 +1,115 @@
+import numpy
+
+from source.control import Reference, PID, Actuator, Sensor
+from source.settings import SYSTEM
+from source.system import System
+
+
+class Simulation:
+
+    SIGNALS = (
+        "time", "reference", "measurement", "error", "control", "integrator", "position", "velocity", "acceleration"
+    )
+
+    PARAMETERS = {
+        "kp": ("controller", "kp"),
+        "ki": ("controller", "ki"),
+        "kd": ("controller", "kd"),
+        "nd": ("controller", "nd"),
+        "limit": ("controller", "limit"),
+        "anti_windup": ("controller", "anti_windup"),
+        "actuator_delay": ("actuator", "delay"),
+        "actuator_limit": ("actuator", "limit"),
+        "sensor_delay": ("sensor", "delay"),
+        "sensor_noise": ("sensor", "noise_amplitude"),
+        "sensor_filter": ("sensor", "noise_filter"),
+        "sensor_noise_model": ("sensor", "noise_model"),
+        "mass": ("system", "mass"),
+        "damping": ("system", "damping"),
+        "integrator": ("system", "integrator"),
+        "plant": ("system", "plant"),
+    }
+
+    def __init__(self, center=(0, 0), seed=None, **parameters):
+        self.now = 0
+
+        self.system = System(center, SYSTEM.MASS, SYSTEM.DAMPING, 0)
+        self.reference = Reference(self.system)
+        self.controller = PID(SYSTEM.KP, SYSTEM.KI, SYSTEM.KD, SYSTEM.ND)
+        self.actuator = Actuator()
+        self.sensor = Sensor(seed=seed)
+
+        self.configure(**parameters)
+
+    def configure(self, **parameters):
+        for name, value in parameters.items():
+            owner, attribute = Simulation.PARAMETERS[name]
+            setattr(getattr(self, owner), attribute, value)
+
+    def configuration(self):
+        return {name: getattr(getattr(self, owner), attribute) for name, (owner, attribute) in Simulation.PARAMETERS.items()}
+
+    def step(self, dt):
+        self.now += dt
+
+        self.actuator.update(self.now)
+        self.sensor.update(self.now)
+
+        self.sensor.request(self.system.pos)
+        self.controller.update(self.reference.pos, self.sensor.value, dt)
+        self.actuator.request(self.controller.output)
+
+        self.system.apply_force(self.actuator.value)
+        self.system.update(dt)
+
+    def sample(self):
+        return (
+            self.now,
+            self.reference.pos,
+            self.sensor.value,
+            self.controller.error,
+            self.actuator.value,
+            self.controller.i_term,
+            self.system.pos,
+            self.system.vel,
+            self.system.acc,
+        )
+
+    def run(self, n_steps, dt):
+        signals = numpy.zeros((len(Simulation.SIGNALS), n_steps), dtype=numpy.float64)
+
+        for index in range(n_steps):
+            self.step(dt)
+            signals[:, index] = self.sample()
+
+        return dict(zip(Simulation.SIGNALS, signals))
+
+
+class FixedStep:
+
+    def __init__(self, rate, max_steps):
+        self.dt = 1 / rate
+        self.max_steps = max_steps
+
+        self.accumulator = 0
+        self.dropped = 0
+        self.steps = 0
+
+    def advance(self, frame_time, warp=1):
+        self.accumulator += frame_time * warp
+        steps = int(self.accumulator / self.dt)
+        max_steps = self.max_steps * warp
+
+        if steps > max_steps:
+            # Spiral of death: let the simulation fall behind wall time instead of catching up forever
+            self.dropped += steps - max_steps
+            steps = max_steps
+            self.accumulator = steps * self.dt + self.accumulator % self.dt
+
+        self.accumulator -= steps * self.dt
+        self.steps += steps
+        return steps
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.dt
@@ -3,33 +3,44 @@ from math import cos, sin, radians, degrees
 import pygame
 from pygame.math import Vector2 as Vector
 
+from source.integrators import INTEGRATORS, integrate, cached_zoh, exact
+from source.Interactive import Interactive
+from source.plants import load_rail_plant
 from source.settings import COLORS, SETTINGS, SYSTEM
 
 
-class System:
+class System(Interactive):
 
     RAIL_WIDTH = SYSTEM.RAIL_WIDTH * SETTINGS.SCALE
     HANDLE_SIZE = SYSTEM.HANDLE_SIZE * SETTINGS.SCALE
 
-    def __init__(self, center, mass, damping, angle, alpha=0.1):
+    def __init__(self, center, mass, damping, angle, time_constant=SYSTEM.ANGLE_TIME_CONSTANT, integrator=SYSTEM.INTEGRATOR,
+                 plant=SYSTEM.PLANT):
+        super().__init__()
         self.center = Vector(center)
 
         self.mass = mass
         self.damping = damping
+        self.integrator = integrator
+
+        self.model = None
+        self._plant = None
+        self.plant = plant
 
         self._target_angle = angle
         self._angle = angle
-        self._angle_filter = alpha
+        self._angle_time_constant = time_constant
 
         self._ray = None
         self._shape = None
         self._left_end = None
         self._right_end = None
+        self._geometry_angle = None
 
         self.tilt(angle)
-        self.update_angle()
 
         self.pos = 0
+        self.last_pos = 0
         self.vel = 0
         self.acc = 0
 
@@ -42,58 +53,114 @@ class System:
 
     @property
     def ray(self):
+        self.update_geometry()
         return self._ray
 
+    @property
+    def angle(self):
+        return self._angle
+
+    @property
+    def target_angle(self):
+        return self._target_angle
+
+    @property
+    def plant(self):
+        return self._plant
+
+    @plant.setter
+    def plant(self, name):
+        self._plant = name
+        self.model = load_rail_plant(name)
+
     def apply_force(self, force):
         self.force += force
 
-    def events(self, mouse_pos, mouse_pressed):
+    def hit(self, mouse_pos):
+        self.update_geometry()
+
         self.hovered_left = (mouse_pos - self._left_end).length() < System.HANDLE_SIZE * 2
         self.hovered_right = (mouse_pos - self._right_end).length() < System.HANDLE_SIZE * 2
+        return self.hovered_left or self.hovered_right
 
-        if mouse_pressed[0]:
-            if self.hovered_left:
-                self.held_left = True
-            if self.hovered_right:
-                self.held_right = True
-        else:
-            self.held_left = False
-            self.held_right = False
-        if mouse_pressed[2] and (self.hovered_left or self.hovered_right):
+    def on_leave(self):
+        super().on_leave()
+        self.hovered_left = False
+        self.hovered_right = False
+
+    def on_press(self, button, mouse_pos):
+        if button == 0:
+            self.held_left = self.hovered_left
+            self.held_right = self.hovered_right
+        if button == 2:
             self.tilt(0)
 
-        if self.held_left or self.held_right:
-            if self.held_left:
-                ray = (self.center - mouse_pos).normalize()
-            else:
-                ray = (mouse_pos - self.center).normalize()
+    def on_drag(self, mouse_pos):
+        if self.held_left:
+            ray = (self.center - mouse_pos).normalize()
+        else:
+            ray = (mouse_pos - self.center).normalize()
+
+        self.tilt(radians(Vector(1, 0).angle_to(ray)))
 
-            self.tilt(radians(Vector(1, 0).angle_to(ray)))
+    def on_release(self):
+        super().on_release()
+        self.held_left = False
+        self.held_right = False
+
+    def acceleration(self, pos, vel):
+        return self.model.acceleration(pos, vel, self.mass, self.damping, SYSTEM.G, self._angle, self.force)[0]
 
     def update(self, dt):
-        self.update_angle()
-        self.apply_force(SYSTEM.G * sin(self._angle))
-        self.apply_force(-self.vel * self.damping)
+        self.last_pos = self.pos
 
-        self.acc = self.force / self.mass
-        self.vel = self.vel + self.acc * dt
-        self.pos = self.pos + self.vel * dt
+        self.update_angle(dt)
 
-        if self.pos > SYSTEM.RAIL_LENGTH / 2:
-            self.pos = SYSTEM.RAIL_LENGTH / 2
-            self.vel = 0
-        if self.pos < -SYSTEM.RAIL_LENGTH / 2:
-            self.pos = -SYSTEM.RAIL_LENGTH / 2
-            self.vel = 0
+        self.acc = self.acceleration(self.pos, self.vel)
+        if self.integrator == "exact":
+            self.pos, self.vel = self.exact_step(dt, SYSTEM.RAIL_LENGTH / 2)
+        else:
+            self.pos, self.vel = integrate(
+                INTEGRATORS[self.integrator], self.acceleration, self.pos, self.vel, dt, SYSTEM.RAIL_LENGTH / 2
+            )
 
         self.force = 0
 
+    def exact_step(self, dt, limit):
+        # The plant is linear while the angle is settled and the mass stays off the rail ends. Rail plants do not
+        # depend on the position, so the velocity slope of the Jacobian is all the zero-order hold needs
+        if abs(self._target_angle - self._angle) < SYSTEM.EXACT_ANGLE_TOLERANCE:
+            (_, (_, slope)), _ = self.model.jacobian(self.pos, 0.0, self.mass, self.damping, SYSTEM.G, self._angle, 0.0)
+            pos, vel = exact(self.pos, self.vel, self.acceleration(self.pos, 0.0), cached_zoh(1.0, -slope, dt))
+            if abs(pos) < limit:
+                return pos, vel
+
+        return integrate(INTEGRATORS[SYSTEM.EXACT_FALLBACK], self.acceleration, self.pos, self.vel, dt, limit)
+
+    def place(self, pos, angle):
+        self.pos = self.last_pos = pos
+        self.vel = 0
+        self._angle = self._target_angle = angle
+
     def tilt(self, angle):
         self._target_angle = angle
 
-    def update_angle(self):
+    def mirror(self, pos, last_pos, angle):
+        # Shows a state simulated elsewhere, the target angle stays whatever the user set here
+        self.pos = pos
+        self.last_pos = last_pos
+        self._angle = angle
+
+    def update_angle(self, dt):
+        alpha = dt / (self._angle_time_constant + dt)
+
         angle_error = (degrees(self._target_angle - self._angle) + 180) % 360 - 180
-        self._angle = self._angle + radians(angle_error) * self._angle_filter
+        self._angle = self._angle + radians(angle_error) * alpha
+
+    def update_geometry(self):
+        if self._geometry_angle == self._angle:
+            return
+        self._geometry_angle = self._angle
 
         self._ray = Vector(cos(self._angle), sin(self._angle))
 
@@ -112,9 +179,24 @@ class System:
             self._ray * dx - norm * dy,
         )
 
-    def render(self, display):
+    def bounds(self):
+        self.update_geometry()
+
+        margin = System.HANDLE_SIZE + SETTINGS.HANDLE_HIGHLIGHT + System.RAIL_WIDTH
+        points = [self._left_end, self._right_end]
+        for pos in (self.last_pos, self.pos):
+            center = self.center + self._ray * pos * SETTINGS.SCALE
+            points.extend(point + center for point in self._shape)
+
+        left, top = min(point.x for point in points), min(point.y for point in points)
+        right, bottom = max(point.x for point in points), max(point.y for point in points)
+        return pygame.Rect(left, top, right - left, bottom - top).inflate(margin * 2 + 2, margin * 2 + 2)
+
+    def render(self, display, alpha=1.0):
+        self.update_geometry()
 
-        center = self.center + self._ray * self.pos * SETTINGS.SCALE
+        pos = self.last_pos + (self.pos - self.last_pos) * alpha
+        center = self.center + self._ray * pos * SETTINGS.SCALE
         points = tuple(point + center for point in self._shape)
 
         if self.hovered_left or self.held_left:
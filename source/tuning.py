@@ -0,0 +1,136 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+
+import numpy
+
+from source.batch import BatchSimulation
+from source.settings import SYSTEM, TUNING
+
+
+def costs(simulation, duration, dt, reference, recorded=(), settled_from=None):
+    # One pass over a batch shared by the gain search and the Monte Carlo run: the step response costs, rail contact,
+    # the largest error from step settled_from on, and the positions at the recorded step indices
+    n_steps = int(round(duration / dt))
+    n = simulation.n
+
+    band = TUNING.SETTLING_BAND * max(abs(reference), 1e-9)
+    sign = 1 if reference >= 0 else -1
+    settled_from = n_steps if settled_from is None else settled_from
+
+    ise = numpy.zeros(n)
+    itae = numpy.zeros(n)
+    overshoot = numpy.zeros(n)
+    settling = numpy.zeros(n)
+    late_error = numpy.zeros(n)
+    rail = numpy.zeros(n, dtype=bool)
+    position = numpy.zeros((len(recorded), n))
+
+    row = 0
+    with numpy.errstate(all="ignore"):
+        for index in range(n_steps):
+            simulation.step(dt)
+            pos = simulation.system.pos
+            error = reference - pos
+            magnitude = numpy.abs(error)
+
+            ise += error ** 2 * dt
+            itae += simulation.now * magnitude * dt
+            overshoot = numpy.maximum(overshoot, -error * sign)
+            settling[magnitude > band] = simulation.now
+            rail |= numpy.abs(pos) >= SYSTEM.RAIL_LENGTH / 2
+            if index >= settled_from:
+                late_error = numpy.maximum(late_error, magnitude)
+
+            while row < len(recorded) and index == recorded[row]:
+                position[row] = pos
+                row += 1
+
+    result = dict(ise=ise, itae=itae, overshoot=overshoot / max(abs(reference), 1e-9), settling=settling)
+    for values in result.values():
+        values[~numpy.isfinite(values)] = numpy.inf
+    return dict(result, late_error=late_error, rail=rail, position=position)
+
+
+def process_pool(workers):
+    # Spawned rather than forked, a fork would copy the pygame state and the simulation thread of the GUI
+    return ProcessPoolExecutor(workers, mp_context=get_context("spawn"))
+
+
+def in_background(function, *args, **kwargs):
+    executor = ThreadPoolExecutor(1)
+    future = executor.submit(function, *args, **kwargs)
+    executor.shutdown(wait=False)
+    return future
+
+
+def evaluate(cost, duration, dt, reference, seed, fixed, candidates):
+    n = len(next(iter(candidates.values())))
+    simulation = BatchSimulation(n, reference=reference, seed=seed, **{**fixed, **candidates})
+    return costs(simulation, duration, dt, reference)[cost]
+
+
+class GainSearch:
+
+    COSTS = "ise", "itae", "overshoot", "settling"
+
+    def __init__(self, ranges=None, cost=TUNING.COST, duration=TUNING.DURATION_S, dt=TUNING.STEP_S,
+                 reference=TUNING.REFERENCE, seed=0, workers=None, chunk_size=TUNING.CHUNK_SIZE, **fixed):
+        if cost not in GainSearch.COSTS:
+            raise ValueError(f"Unknown cost '{cost}', expected one of {GainSearch.COSTS}")
+
+        self.ranges = dict(ranges or TUNING.RANGES)
+        self.cost = cost
+        self.duration = duration
+        self.dt = dt
+        self.reference = reference
+        self.seed = seed
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.fixed = {name: value for name, value in fixed.items() if name not in self.ranges}
+
+    def sample(self, n, ranges, generator):
+        return {name: generator.uniform(low, high, n) for name, (low, high) in ranges.items()}
+
+    def sweep(self, candidates, sequence, pool):
+        n = len(next(iter(candidates.values())))
+        starts = range(0, n, self.chunk_size)
+        seeds = sequence.spawn(len(starts))
+
+        futures = [
+            pool.submit(
+                evaluate, self.cost, self.duration, self.dt, self.reference, seed, self.fixed,
+                {name: values[start:start + self.chunk_size] for name, values in candidates.items()}
+            )
+            for start, seed in zip(starts, seeds)
+        ]
+        return numpy.concatenate([future.result() for future in futures])
+
+    def run(self, n=TUNING.CANDIDATES, rounds=TUNING.ROUNDS, keep=TUNING.KEEP):
+        sequence = numpy.random.SeedSequence(self.seed)
+        generator = numpy.random.default_rng(sequence.spawn(1)[0])
+        ranges = dict(self.ranges)
+
+        candidates = {name: numpy.zeros(0) for name in ranges}
+        scores = numpy.zeros(0)
+
+        with process_pool(self.workers) as pool:
+            for _ in range(rounds):
+                batch = self.sample(n, ranges, generator)
+                scores = numpy.concatenate((scores, self.sweep(batch, sequence.spawn(1)[0], pool)))
+                candidates = {name: numpy.concatenate((candidates[name], batch[name])) for name in ranges}
+
+                # Narrow every range around the best candidates found so far
+                best = numpy.argsort(scores)[:keep]
+                for name, (low, high) in self.ranges.items():
+                    values = candidates[name][best]
+                    margin = (high - low) * 0.05
+                    ranges[name] = max(low, values.min() - margin), min(high, values.max() + margin)
+
+        order = numpy.argsort(scores)[:keep]
+        return [
+            dict(cost=float(scores[index]), **{name: float(candidates[name][index]) for name in ranges})
+            for index in order
+        ]
+
+    def start(self, *args, **kwargs):
+        return in_background(self.run, *args, **kwargs)
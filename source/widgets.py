@@ -1,69 +1,127 @@
+from collections import OrderedDict
+
 import pygame
 from pygame.math import Vector2 as Vector
 
-pygame.font.init()
+from source.dispatch import Dispatcher
+from source.fonts import FONTS
+from source.Interactive import Interactive
+from source.settings import SETTINGS
+
+
+class TextCache:
+
+    def __init__(self, max_bytes, max_sizes=1024):
+        self.max_bytes = max_bytes
+        self.max_sizes = max_sizes
+        self.bytes = 0
+
+        self._surfaces = OrderedDict()
+        self._sizes = OrderedDict()
+
+    def render(self, font, text, color, antialias=True):
+        key = font, text, tuple(color), antialias
+
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            return surface
+
+        surface = font.render(text, antialias, color)
+        self._surfaces[key] = surface
+        self.bytes += surface.get_pitch() * surface.get_height()
+
+        while self.bytes > self.max_bytes and len(self._surfaces) > 1:
+            _, evicted = self._surfaces.popitem(last=False)
+            self.bytes -= evicted.get_pitch() * evicted.get_height()
+
+        return surface
+
+    def size(self, font, text):
+        key = font, text
+
+        size = self._sizes.get(key)
+        if size is not None:
+            self._sizes.move_to_end(key)
+            return size
+
+        size = self._sizes[key] = font.size(text)
+        if len(self._sizes) > self.max_sizes:
+            self._sizes.popitem(last=False)
+
+        return size
+
+    def clear(self):
+        self._surfaces.clear()
+        self._sizes.clear()
+        self.bytes = 0
+
+
+TEXT_CACHE = TextCache(SETTINGS.TEXT_CACHE_BYTES)
 
 
 class WidgetContainer(list):
 
     def __init__(self):
         list.__init__([])
+        self.dispatcher = Dispatcher()
 
     def add(self, widget):
         if not widget in self:
             self.append(widget)
             self.sort(key=lambda w: w.layer)
 
-    def events(self, *args, **kwargs):
-        for widget in self:
-            widget.events(*args, **kwargs)
+            # Static widgets never react, so they stay out of the event index
+            if not widget.static:
+                self.dispatcher.add(widget)
+
+    def relocate(self, widget):
+        self.dispatcher.relocate(widget)
+
+    def events(self, mouse_pos, mouse_pressed, event_list):
+        self.dispatcher.dispatch(mouse_pos, mouse_pressed, event_list)
 
     @property
     def typing(self):
-        for widget in self:
-            if isinstance(widget, Tuner) and widget.typing:
-                return True
-        else:
-            return False
+        return self.dispatcher.focus.typing
 
     def render(self, display):
         for widget in self:
             widget.render(display)
 
 
-class Widget(pygame.Rect):
+class Widget(pygame.Rect, Interactive):
 
-    SMALL_FONT = pygame.font.SysFont("monospace", 22, True)
-    LARGE_FONT = pygame.font.SysFont("monospace", 32, True)
+    SMALL_FONT = 22
+    LARGE_FONT = 32
 
     def __init__(self, container: WidgetContainer, rect, color):
         super().__init__(rect)
+        Interactive.__init__(self)
 
-        container.add(self)
-
-        self.font = Widget.SMALL_FONT
+        self.container = container
+        self.font = FONTS.get(Widget.SMALL_FONT)
         self.color = color
 
-        self.hovered = False
-        self.clicked = False
-        self.held = False
-
-        self.last_pressed = pygame.mouse.get_pressed()
+        container.add(self)
 
     @property
     def layer(self):
         return 1
 
-    def events(self, mouse_pos, mouse_pressed, key_pressed):
-        self.hovered = self.collidepoint(mouse_pos)
-        self.clicked = self.hovered and (mouse_pressed[0] and not self.last_pressed[0])
+    @property
+    def static(self):
+        return type(self) is Widget
+
+    @property
+    def area(self):
+        return pygame.Rect(self)
 
-        if self.clicked:
-            self.held = True
-        if not mouse_pressed[0]:
-            self.held = False
+    def state(self):
+        return self.color
 
-        self.last_pressed = mouse_pressed
+    def render_text(self, text, color):
+        return TEXT_CACHE.render(self.font, text, color)
 
     def render(self, display):
         pygame.draw.rect(display, self.color, self)
@@ -74,7 +132,7 @@ class TextWidget(Widget):
     def __init__(self, container, anchor, text, color, large=False, align="topleft"):
         super().__init__(container, (0, 0, 1, 1), color)
 
-        self.font = Widget.LARGE_FONT if large else Widget.SMALL_FONT
+        self.font = FONTS.get(Widget.LARGE_FONT if large else Widget.SMALL_FONT)
 
         self.anchor = Vector(anchor)
         self.align = align
@@ -83,12 +141,16 @@ class TextWidget(Widget):
 
     def set_text(self, new_text):
         self.text = new_text
-        width, height = self.font.size(new_text)
+        width, height = TEXT_CACHE.size(self.font, new_text)
         self.update(0, 0, width, height)
         setattr(self, self.align, self.anchor)
+        self.container.relocate(self)
+
+    def state(self):
+        return self.text, self.color
 
     def render(self, display):
-        surface = self.font.render(self.text, True, self.color)
+        surface = self.render_text(self.text, self.color)
         display.blit(surface, self)
 
     @property
@@ -117,15 +179,18 @@ class TextPairWidget(TextWidget):
         self._base_text = new_text
         super().set_text(self.full_text)
 
+    def state(self):
+        return self.full_text, self.hovered
+
     def render(self, display):
         text_color = self.color[0]
         value_color = self.color[1]
 
-        text_surface = self.font.render(self._base_text + self._delimiter, True, text_color[self.hovered])
-        value_surface = self.font.render(self._value_text, True, value_color[self.hovered])
+        text_surface = self.render_text(self._base_text + self._delimiter, text_color[self.hovered])
+        value_surface = self.render_text(self._value_text, value_color[self.hovered])
 
         display.blit(text_surface, (self.left, self.top))
-        display.blit(value_surface, (self.left + self.font.size(self._base_text + self._delimiter)[0], self.top))
+        display.blit(value_surface, (self.left + text_surface.get_width(), self.top))
 
 
 class Switch(TextPairWidget):
@@ -145,15 +210,15 @@ class Switch(TextPairWidget):
         self._state = not self._state
         self.set_value_text(self.state_text)
 
-    def events(self, *args, **kwargs):
-        super().events(*args, **kwargs)
-
-        if self.clicked:
+    def on_press(self, button, mouse_pos):
+        if button == 0:
             self.relay()
 
 
 class Tuner(TextPairWidget):
 
+    focusable = True
+
     def __init__(self, container, anchor, text, color, base_value, step=0.1, limits=(-1, 1), decimals=1, align="topleft"):
         self._value = 0
         self.typing = False
@@ -196,26 +261,18 @@ class Tuner(TextPairWidget):
         if not rollback and self._typed_text.isnumeric():
             self.set_value(float(self._typed_text))
 
-    def events(self, mouse_pos, mouse_pressed, event_list):
-        super().events(mouse_pos, mouse_pressed, event_list)
-
-        if self.hovered:
-            if mouse_pressed[3]:
-                self.set_value(self._value + self._step * mouse_pressed[3])
-            if mouse_pressed[2]:
-                self.set_value(self._base_value)
-
-        if self.typing:
-            for event in event_list:
-                if event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_RETURN:
-                        self.deactivate_typing()
-                    elif event.key == pygame.K_ESCAPE:
-                        self.deactivate_typing(True)
-                    else:
-                        self._typed_text += pygame.key.name(event.key)
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    self.deactivate_typing(True)
-
-        if self.clicked:
-            self.activate_typing()
+    def on_wheel(self, amount):
+        self.set_value(self._value + self._step * amount)
+
+    def on_press(self, button, mouse_pos):
+        if button == 2:
+            self.set_value(self._base_value)
+
+    def on_focus(self):
+        self.activate_typing()
+
+    def on_key(self, event):
+        self._typed_text += pygame.key.name(event.key)
+
+    def on_blur(self, rollback):
+        self.deactivate_typing(rollback)
@@ -1,37 +1,88 @@
-from sympy import symbols, diff, sin, cos, Eq, simplify
+from sympy import symbols, diff, sin, cos, Eq, Rational, simplify
 from sympy.physics.vector import ReferenceFrame, dynamicsymbols
 
+from source.codegen import Model
+
 R = ReferenceFrame("R")
 
 ex_ = R.x
 ey_ = R.y
 ez_ = R.z
 
-m, g, k, f = symbols("m, g, k, f")
-x = dynamicsymbols("x")
-
-dx = diff(x, "t")
-ddx = diff(dx, "t")
+# Screen coordinates: y points down, so gravity pulls along +y and a positive tilt lowers the right end of the rail.
+# The sandbox has always pulled the body on the rail with a weight of g, whatever its mass, and the models keep that
+m, g, k, f, u = symbols("m, g, k, f, u")
+mp, l = symbols("mp, l")
 
 f_ = cos(f) * ex_ + sin(f) * ey_
-v_ = dx * f_
 
-E = 1/2 * m * v_.magnitude()**2
 
-q = x
-dq = dx
+def lagrange(E, forces, coordinates):
+    # d/dt(dE/ddq) - dE/dq = Q for each coordinate, Q being the forces projected on the partial velocities
+    equations = []
+    for q in coordinates:
+        dq = diff(q, "t")
+
+        DE_Ddq = diff(E, dq)
+        d_DE_Ddq_dt = diff(DE_Ddq, "t")
+        DE_Dq = diff(E, q)
+
+        Q = sum(F_.dot(diff(v_, dq, R)) for v_, F_ in forces)
+        equations.append(d_DE_Ddq_dt - DE_Dq - Q)
+
+    return equations
+
+
+def cart():
+    # A block sliding on the rail, the plant the sandbox was built around
+    x = dynamicsymbols("x")
+    dx = diff(x, "t")
+
+    v_ = dx * f_
+    E = m * v_.dot(v_) / 2
+
+    F_ = g * ey_ - k * v_ + u * f_
+    return Model("cart", [x], [m, k, g, f], [u], lagrange(E, [(v_, F_)], [x]))
+
+
+def rolling_ball():
+    # A solid ball rolling on the rail without slipping, so part of its energy goes into spinning
+    x = dynamicsymbols("x")
+    dx = diff(x, "t")
+    r = symbols("r", positive=True)
+
+    v_ = dx * f_
+    inertia = Rational(2, 5) * m * r ** 2
+    E = m * v_.dot(v_) / 2 + inertia * (dx / r) ** 2 / 2
+
+    F_ = g * ey_ - k * v_ + u * f_
+    return Model("rolling_ball", [x], [m, k, g, f], [u], lagrange(E, [(v_, F_)], [x]))
+
+
+def pendulum():
+    # The cart with a point mass hanging from it on a rigid rod, a swinging angle of zero hangs straight down
+    x, a = dynamicsymbols("x, a")
+    dx, da = diff(x, "t"), diff(a, "t")
+
+    v_ = dx * f_
+    vp_ = v_ + l * da * (cos(a) * ex_ - sin(a) * ey_)
+    E = m * v_.dot(v_) / 2 + mp * vp_.dot(vp_) / 2
+
+    F_ = g * ey_ - k * v_ + u * f_
+    Fp_ = mp * g * ey_
+    return Model("pendulum", [x, a], [m, k, g, f, mp, l], [u], lagrange(E, [(v_, F_), (vp_, Fp_)], [x, a]))
 
-DE_Ddq = diff(E, dq)
-d_DE_Ddq_dt = diff(DE_Ddq, "t")
-DE_Dq = diff(E, q)
 
-k_ = -v_ * k
+MODELS = dict(cart=cart, rolling_ball=rolling_ball, pendulum=pendulum)
 
-B_ = diff(v_, dq, R)
-F_ = -g * ey_ + k_
 
-Q = F_.dot(B_)
+if __name__ == "__main__":
+    from source.plants import load_plant
 
-eq_motion = simplify(Eq(d_DE_Ddq_dt - DE_Dq, Q))
+    for name, build in MODELS.items():
+        model = build()
+        for coordinate, equation in zip(model.coordinates, model.equations):
+            print(f"{name}: {simplify(Eq(equation, 0))}")
 
-print(eq_motion)
\ No newline at end of file
+        plant = load_plant(name)
+        print(f"{name}: generated {plant.__file__}")
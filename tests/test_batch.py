@@ -0,0 +1,49 @@
+import numpy
+import pytest
+
+from source.batch import BatchSimulation
+from source.simulation import Simulation
+
+DT = 1 / 960
+PARAMETERS = dict(ki=1, kd=5, sensor_delay=0.05, actuator_delay=0.02, actuator_limit=8)
+
+
+def scalar_run(seed, tilt, steps, **parameters):
+    simulation = Simulation(seed=seed, **parameters)
+    simulation.reference.pos = 1.0
+    simulation.system.tilt(tilt)
+
+    positions = []
+    for _ in range(steps):
+        simulation.step(DT)
+        positions.append(simulation.system.pos)
+    return numpy.array(positions)
+
+
+def batch_run(n, seed, tilt, steps, **parameters):
+    simulation = BatchSimulation(n, reference=1.0, seed=seed, **parameters)
+    simulation.system.tilt(tilt)
+
+    positions = []
+    for _ in range(steps):
+        simulation.step(DT)
+        positions.append(simulation.system.pos.copy())
+    return numpy.array(positions)
+
+
+def test_batch_columns_follow_their_scalar_loops():
+    # Each column has its own gain, and the loops differ only in floating point rounding
+    gains = numpy.array([5.0, 20.0, 60.0])
+    batch = batch_run(len(gains), 0, 0.1, 4000, kp=gains, **PARAMETERS)
+
+    for column, gain in enumerate(gains):
+        scalar = scalar_run(0, 0.1, 4000, kp=gain, **PARAMETERS)
+        numpy.testing.assert_allclose(batch[:, column], scalar, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("model", ["uniform", "gaussian", "brown"])
+def test_single_column_batch_shares_the_seeded_noise(model):
+    parameters = dict(PARAMETERS, kp=20, sensor_noise=0.01, sensor_noise_model=model)
+    batch = batch_run(1, 3, -0.1, 4000, **parameters)[:, 0]
+    scalar = scalar_run(3, -0.1, 4000, **parameters)
+    numpy.testing.assert_allclose(batch, scalar, rtol=0, atol=1e-9)
@@ -0,0 +1,40 @@
+import numpy
+import pytest
+
+from source.control import Delay
+
+
+def run(delay, steps, time=0.0):
+    # A ramp makes the delay readable straight off the output: time - value
+    output = []
+    for dt in steps:
+        time += dt
+        delay.update(time)
+        delay.request(time)
+        output.append((time, delay.value))
+    return numpy.array(output)
+
+
+@pytest.mark.parametrize("capacity", [2, 1024])
+def test_delay_is_in_seconds_with_variable_steps(capacity):
+    steps = numpy.random.default_rng(0).choice([0.001, 0.02], 3000)
+    output = run(Delay(0.05, capacity), steps)
+
+    settled = output[output[:, 0] > 0.2]
+    numpy.testing.assert_allclose(settled[:, 0] - settled[:, 1], 0.05, atol=1e-9)
+
+
+def test_delay_holds_at_least_one_step():
+    output = run(Delay(0.0), [0.01] * 100)
+    numpy.testing.assert_allclose(output[1:, 0] - output[1:, 1], 0.01, atol=1e-9)
+
+
+def test_delay_retune_slews_without_jumping():
+    delay = Delay(0.01)
+    output = run(delay, [0.001] * 500)
+    delay.delay = 0.1
+    output = numpy.vstack((output, run(delay, [0.001] * 500, output[-1, 0])))
+
+    # The read time never goes backwards and the delay ends up where it was set
+    assert numpy.all(numpy.diff(output[:, 1]) >= -1e-12)
+    assert output[-1, 0] - output[-1, 1] == pytest.approx(0.1, abs=1e-9)
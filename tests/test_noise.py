@@ -0,0 +1,33 @@
+import numpy
+import pytest
+
+from source.noise import Noise
+from source.settings import SYSTEM
+
+
+def recursion(level, white, leak):
+    samples = numpy.empty_like(white)
+    for index, value in enumerate(white):
+        level = leak * level + value
+        samples[index] = level
+    return samples
+
+
+@pytest.mark.parametrize("leak", [0.998, 0.9, 0.5, 0.01, 0.0])
+@pytest.mark.parametrize("n", [None, 3])
+def test_brown_matches_recursion(monkeypatch, leak, n):
+    monkeypatch.setattr(SYSTEM, "NOISE_BROWN_LEAK", leak)
+    noise = Noise("brown", seed=1, n=n, block=1 << 16)
+
+    # Same seed and draw order as Noise.brown, so the reference sees the same white noise
+    generator = numpy.random.default_rng(1)
+    level = generator.standard_normal(noise.shape[1:])
+
+    for _ in range(2):
+        samples = noise.generate()
+        white = generator.standard_normal(noise.shape) * numpy.sqrt(1 - leak ** 2)
+        expected = recursion(level, white, leak)
+        level = expected[-1]
+
+        assert numpy.isfinite(samples).all()
+        numpy.testing.assert_allclose(samples, expected, rtol=1e-9, atol=1e-9)
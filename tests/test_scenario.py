@@ -0,0 +1,24 @@
+import numpy
+import pytest
+
+from source.scenario import Profile
+
+
+def test_steps_profile_holds_initial_value_until_first_step():
+    profile = Profile("steps", points=[[0.5, 1.0], [2.0, -1.0]])
+    numpy.testing.assert_array_equal(profile([0.0, 0.25, 0.5, 0.6, 2.0, 3.0]), [0.0, 0.0, 1.0, 1.0, -1.0, -1.0])
+
+
+def test_steps_profile_initial_value():
+    profile = Profile("steps", value=0.3, points=[[1.0, 1.0]])
+    numpy.testing.assert_array_equal(profile([0.0, 0.99, 1.0]), [0.3, 0.3, 1.0])
+
+
+def test_linear_profile_interpolates_and_holds_the_ends():
+    profile = Profile("linear", points=[[2.0, 0.0], [6.0, 5.0]])
+    numpy.testing.assert_allclose(profile([0.0, 4.0, 10.0]), [0.0, 2.5, 5.0])
+
+
+def test_profile_needs_points():
+    with pytest.raises(ValueError):
+        Profile("steps")